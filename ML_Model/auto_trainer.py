@@ -2,101 +2,383 @@
 auto_trainer.py — Automatic ML Model Retraining
 =================================================
 Monitors new SMS count and triggers retraining when threshold is met.
-Runs as a background thread in the FastAPI server.
+Runs as a background asyncio task on the FastAPI server's event loop.
 """
 
 import os
-import sys
-import json
+import random
+import asyncio
+import logging
+import multiprocessing
 import threading
 import time
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from enum import IntEnum
+from typing import Optional
 
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import orjson
+import pandas as pd
+
+from pipeline.storage import count_records, load_json, write_atomic
+
+log = logging.getLogger('AutoTrainer')
+
+# Training pipeline — resolved once at load so a broken install is reported
+# at startup instead of surfacing as a failed retrain much later
+try:
+    from pipeline.preprocessor import load_and_preprocess, export_csv
+    from pipeline.classifier import SmsClassifier
+except ImportError as e:
+    load_and_preprocess = export_csv = SmsClassifier = None
+    log.warning("Training pipeline unavailable — retraining disabled: %s", e)
+
+# Optional: OS-level file watching (inotify/FSEvents/ReadDirectoryChangesW)
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    HAS_WATCHDOG = True
+except ImportError:
+    HAS_WATCHDOG = False
+    log.warning("watchdog not installed — falling back to polling. Install: pip install watchdog")
+
+# Optional: Parquet cache of the preprocessed corpus
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+    log.warning("pyarrow not installed — full corpus is reprocessed on every retrain. Install: pip install pyarrow")
 
 RETRAIN_THRESHOLD = 200  # Retrain after 200 new SMS
-CHECK_INTERVAL = 300     # Check every 5 minutes
+CHECK_INTERVAL = 300     # Initial poll interval (polling fallback)
+ACTIVE_CHECK_INTERVAL = 10  # Poll interval right after new SMS arrived
+MAX_IDLE_BACKOFF = 3600     # Idle polling backs off up to once an hour
+BACKOFF_JITTER = 30         # Random seconds added so instances don't poll in lockstep
+HEARTBEAT_INTERVAL = 3600  # Safety re-check when file watching is active
+WATCH_DEBOUNCE = 1.0       # Let a burst of write events settle before checking
+MIN_SMS_BYTES = 20         # Conservative lower bound on one JSONL record's size
+STATUS_TTL = 1.0           # get_status() reuses its last answer for this long (seconds)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-SMS_RAW_FILE = os.path.join(BASE_DIR, "sms_data.json")
+SMS_RAW_FILE = os.path.join(BASE_DIR, "sms_data.jsonl")
 TRAINING_STATUS_FILE = os.path.join(BASE_DIR, "data", "training_status.json")
+PREPROCESSED_CACHE_FILE = os.path.join(BASE_DIR, "data", "processed.parquet")
+# labeled_sms.csv is only for manual inspection; the classifier trains from memory
+EXPORT_CSV = os.environ.get('FINSIGHT_EXPORT_CSV', '0') == '1'
+# The training worker starts from a fresh interpreter: forking the threaded
+# server could copy a lock another thread holds (logging, SQLite, the store
+# locks) into the child and deadlock it. forkserver where available (POSIX),
+# spawn otherwise (Windows, where that was already the only option)
+_TRAINING_MP_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+
+if HAS_WATCHDOG:
+    class _SmsFileHandler(FileSystemEventHandler):
+        """Wakes the trainer's monitor loop whenever sms_data.jsonl is written."""
+
+        def __init__(self, trainer: "AutoTrainer"):
+            super().__init__()
+            self.trainer = trainer
+
+        def _check(self, path: str):
+            if os.path.abspath(path) == SMS_RAW_FILE:
+                self.trainer._on_sms_file_changed()
+
+        def on_modified(self, event):
+            self._check(event.src_path)
+
+        def on_created(self, event):
+            self._check(event.src_path)
+
+        def on_moved(self, event):
+            # Atomic writers (tmp file + os.replace) show up as a move
+            self._check(event.dest_path)
+
+
+def _load_preprocessed_cache() -> Optional[pd.DataFrame]:
+    """Return the cached preprocessed rows, or None if unusable."""
+    if not HAS_PYARROW or not os.path.exists(PREPROCESSED_CACHE_FILE):
+        return None
+    try:
+        df = pd.read_parquet(PREPROCESSED_CACHE_FILE, engine='pyarrow')
+    except Exception as e:
+        log.warning("Preprocessed cache unreadable, rebuilding: %s", e)
+        return None
+    # More cached rows than records means the SMS file was rewritten
+    if len(df) > count_records(SMS_RAW_FILE):
+        return None
+    return df
+
+
+def _save_preprocessed_cache(df: pd.DataFrame):
+    if not HAS_PYARROW:
+        return
+    tmp = PREPROCESSED_CACHE_FILE + '.tmp'
+    try:
+        df.to_parquet(tmp, engine='pyarrow', index=False)
+        os.replace(tmp, PREPROCESSED_CACHE_FILE)
+    except Exception as e:
+        log.warning("Could not write preprocessed cache (non-critical): %s", e)
+
+
+def _run_training() -> dict:
+    """
+    Preprocess the SMS corpus and train the classifier (runs in the worker
+    process). Module-level and argument-free, so the fresh worker process
+    imports this module and reads its paths like any other caller.
+    """
+    # SMS are only ever appended, so just the rows beyond the cache need
+    # labeling and feature extraction
+    cached = _load_preprocessed_cache()
+    if cached is None:
+        df = load_and_preprocess(SMS_RAW_FILE)
+    else:
+        df_new = load_and_preprocess(SMS_RAW_FILE, skip=len(cached))
+        df = pd.concat([cached, df_new], ignore_index=True) if len(df_new) else cached
+        log.info("Reused %d preprocessed SMS, processed %d new", len(cached), len(df_new))
+    _save_preprocessed_cache(df)
+    if EXPORT_CSV:
+        export_csv(df, os.path.join(BASE_DIR, 'data', 'labeled_sms.csv'))
+    
+    classifier = SmsClassifier()
+    return classifier.train(df, save=True)
+
+
+# Supabase logging is a network round-trip; keep it off the training path
+_log_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='training-log')
+
+
+def _log_training_remote(**kwargs):
+    from supabase_client import log_training
+    log_training(**kwargs)
+
+
+def _report_log_failure(future: Future):
+    error = future.exception()
+    if error is not None:
+        log.warning("Supabase log failed (non-critical): %s", error)
+
+
+class State(IntEnum):
+    IDLE = 0
+    TRAINING = 1
 
 
 class AutoTrainer:
     """Background auto-retrainer that monitors for new SMS data."""
     
     def __init__(self):
-        self.is_training = False
-        self.last_trained_count = self._get_last_trained_count()
-        self.last_accuracy = 0.0
-        self._thread = None
-        self._stop_event = threading.Event()
-    
-    def _get_last_trained_count(self) -> int:
-        """Get the SMS count from the last training run."""
-        status_file = TRAINING_STATUS_FILE
-        if os.path.exists(status_file):
-            with open(status_file, 'r') as f:
-                status = json.load(f)
-                return status.get('total_sms_trained', 0)
-        return 0
-    
-    def _get_current_sms_count(self) -> int:
-        """Get current total SMS count."""
-        if os.path.exists(SMS_RAW_FILE):
-            with open(SMS_RAW_FILE, 'r') as f:
-                data = json.load(f)
-                return len(data)
-        return 0
+        self._state = State.IDLE
+        self._status_lock = threading.Lock()
+        # Guards the IDLE -> TRAINING transition so concurrent callers (API
+        # requests + monitor thread) cannot launch duplicate training runs
+        self._state_lock = threading.Lock()
+        # training_status.json only changes when retrain() rewrites it, so the
+        # in-memory copy is authoritative after construction
+        self._status_cache: dict = self._load_status()
+        self.last_trained_count = self._status_cache.get('total_sms_trained', 0)
+        self.last_accuracy = self._status_cache.get('accuracy', 0.0)
+        self._last_trained_size = self._status_cache.get('sms_file_size', 0)
+        # Guards the cached count: the monitor checks it in a worker thread
+        # while request handlers append SMS and read it
+        self._count_lock = threading.Lock()
+        self._cached_count: Optional[int] = None
+        self._sms_mtime_ns: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Training runs in a separate process: it is CPU-bound sklearn/xgboost
+        # work that would otherwise hold the GIL against the API threads
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._training_future: Optional[Future] = None
+        self._observer = None
+        # Set from the watchdog thread (via call_soon_threadsafe) on SMS writes
+        self._wake: Optional[asyncio.Event] = None
+        self._idle_backoff = CHECK_INTERVAL
+        self._status_reply: Optional[dict] = None
+        self._status_reply_ts = 0.0
+    
+    @property
+    def is_training(self) -> bool:
+        return self._state == State.TRAINING
+    
+    def _load_status(self) -> dict:
+        """Read the status of the last training run from disk."""
+        if os.path.exists(TRAINING_STATUS_FILE):
+            return load_json(TRAINING_STATUS_FILE)
+        return {}
+    
+    def _save_status(self, status: dict):
+        """Persist a new training status and make it the cached copy."""
+        with self._status_lock:
+            os.makedirs(os.path.dirname(TRAINING_STATUS_FILE), exist_ok=True)
+            write_atomic(TRAINING_STATUS_FILE, orjson.dumps(status, option=orjson.OPT_INDENT_2))
+            self._status_cache = status
+    
+    @staticmethod
+    def _sms_file_mtime_ns() -> Optional[int]:
+        try:
+            return os.stat(SMS_RAW_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    @staticmethod
+    def _sms_file_size() -> int:
+        try:
+            return os.stat(SMS_RAW_FILE).st_size
+        except FileNotFoundError:
+            return 0
+    
+    def get_sms_count(self) -> int:
+        """Get current total SMS count (cached; recounted only when the file changed)."""
+        with self._count_lock:
+            mtime_ns = self._sms_file_mtime_ns()
+            if self._cached_count is None or mtime_ns != self._sms_mtime_ns:
+                self._cached_count = count_records(SMS_RAW_FILE)
+                self._sms_mtime_ns = mtime_ns
+            return self._cached_count
+    
+    @contextmanager
+    def appending(self, n: int):
+        """
+        Hold while the ingestion path appends n SMS: the cached count moves
+        with the write instead of recounting, and no recount can land
+        between the append and the update (counting the new SMS twice).
+        """
+        with self._count_lock:
+            yield
+            if self._cached_count is not None:
+                self._cached_count += n
+                self._sms_mtime_ns = self._sms_file_mtime_ns()
+    
+    def invalidate_count(self):
+        """Forget the cached count (file rewritten or changed externally)."""
+        with self._count_lock:
+            self._cached_count = None
+            self._sms_mtime_ns = None
+    
+    def discard_preprocessed_cache(self):
+        """Drop the preprocessed-corpus cache after the SMS file is rewritten."""
+        try:
+            os.remove(PREPROCESSED_CACHE_FILE)
+        except FileNotFoundError:
+            pass
     
     def get_status(self) -> dict:
-        """Get current training status."""
-        current_count = self._get_current_sms_count()
-        new_since_training = current_count - self.last_trained_count
+        """Get current training status (cached for STATUS_TTL seconds)."""
+        now = time.monotonic()
+        reply = self._status_reply
+        if reply is not None and now - self._status_reply_ts < STATUS_TTL:
+            return reply
+        
+        current_count = self.get_sms_count()
+        with self._state_lock:
+            is_training = self._state == State.TRAINING
+            last_trained_count = self.last_trained_count
+        new_since_training = max(0, current_count - last_trained_count)
         
-        return {
-            'is_training': self.is_training,
-            'last_trained_count': self.last_trained_count,
+        reply = {
+            'is_training': is_training,
+            'last_trained_count': last_trained_count,
             'current_sms_count': current_count,
-            'new_since_training': max(0, new_since_training),
+            'new_since_training': new_since_training,
             'threshold': RETRAIN_THRESHOLD,
-            'progress_to_retrain': min(100, int(max(0, new_since_training) / RETRAIN_THRESHOLD * 100)),
+            'progress_to_retrain': min(100, new_since_training * 100 // RETRAIN_THRESHOLD),
             'last_accuracy': self.last_accuracy,
         }
+        self._status_reply = reply
+        self._status_reply_ts = now
+        return reply
     
     def should_retrain(self) -> bool:
         """Check if retraining threshold is met."""
-        current = self._get_current_sms_count()
-        new_count = current - self.last_trained_count
-        return new_count >= RETRAIN_THRESHOLD and not self.is_training
+        with self._state_lock:
+            is_training = self._state == State.TRAINING
+            last_trained_count = self.last_trained_count
+            last_trained_size = self._last_trained_size
+        if is_training:
+            return False
+        # Cheap stat-only bound: if the file grew by fewer bytes than THRESHOLD
+        # minimal records, the threshold cannot have been reached. A shrunken
+        # file was rewritten (dedup/clear), so fall through and count.
+        grown = self._sms_file_size() - last_trained_size
+        if 0 <= grown < RETRAIN_THRESHOLD * MIN_SMS_BYTES:
+            return False
+        current = self.get_sms_count()
+        return current - last_trained_count >= RETRAIN_THRESHOLD
     
     def retrain(self, triggered_by: str = 'threshold') -> dict:
-        """Execute retraining pipeline."""
-        if self.is_training:
+        """Execute retraining pipeline and wait for the result."""
+        future = self.start_retrain(triggered_by)
+        if future is None:
             return {'status': 'already_training'}
+        return future.result()
+    
+    def start_retrain(self, triggered_by: str = 'threshold') -> Optional[Future]:
+        """Submit retraining to the worker process and return immediately.
+        
+        Returns a Future resolving to the same dict retrain() returns, or
+        None if a training run is already in progress.
+        """
+        if SmsClassifier is None:
+            done = Future()
+            done.set_result({'status': 'failed', 'error': 'training pipeline not available'})
+            return done
         
-        self.is_training = True
-        print(f"\n[AutoTrainer] 🔄 Retraining triggered by: {triggered_by}")
-        print(f"[AutoTrainer] SMS count: {self._get_current_sms_count()}")
+        with self._state_lock:
+            if self._state != State.IDLE:
+                return None
+            self._state = State.TRAINING
+            self._status_reply = None
+            last_trained_count = self.last_trained_count
         
+        # Snapshot the count the worker is about to train on
+        current_count = self.get_sms_count()
+        file_size = self._sms_file_size()
+        log.info("🔄 Retraining triggered by: %s", triggered_by)
+        log.info("SMS count: %d", current_count)
+        
+        result = Future()
         try:
-            from pipeline.preprocessor import load_and_preprocess, export_csv
-            from pipeline.classifier import SmsClassifier
-            
-            # Load and preprocess
-            df = load_and_preprocess(SMS_RAW_FILE)
-            csv_path = os.path.join(BASE_DIR, 'data', 'labeled_sms.csv')
-            export_csv(df, csv_path)
-            
-            # Train
-            classifier = SmsClassifier()
-            metrics = classifier.train(df, save=True)
-            
-            current_count = self._get_current_sms_count()
-            new_count = current_count - self.last_trained_count
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=1, mp_context=_TRAINING_MP_CONTEXT)
+            job = self._executor.submit(_run_training)
+        except Exception as e:
+            log.error("Could not start training worker: %s", e)
+            self._executor = None
+            with self._state_lock:
+                self._state = State.IDLE
+                self._status_reply = None
+            result.set_result({'status': 'failed', 'error': str(e)})
+            return result
+        
+        job.add_done_callback(
+            lambda job: result.set_result(
+                self._finish_retrain(job, triggered_by, current_count, last_trained_count, file_size)
+            )
+        )
+        self._training_future = result
+        return result
+    
+    def _finish_retrain(self, job: Future, triggered_by: str,
+                        current_count: int, last_trained_count: int, file_size: int) -> dict:
+        """Record the outcome of a worker training run (runs in the parent)."""
+        try:
+            if job.cancelled():
+                return {'status': 'failed', 'error': 'training cancelled'}
+            error = job.exception()
+            if error is not None:
+                if isinstance(error, BrokenProcessPool):
+                    # Worker died (e.g. OOM-killed) — start a fresh pool next time
+                    self._executor = None
+                log.error("Retraining failed", exc_info=error)
+                return {'status': 'failed', 'error': str(error)}
             
-            # Update status
-            self.last_trained_count = current_count
-            self.last_accuracy = metrics['cv_accuracy_mean']
+            metrics = job.result()
+            new_count = current_count - last_trained_count
             
             # Save training status
             status = {
@@ -106,28 +388,28 @@ class AutoTrainer:
                 'triggered_by': triggered_by,
                 'new_sms_count': new_count,
                 'trained_at': datetime.now().isoformat(),
+                'sms_file_size': file_size,
             }
             
-            os.makedirs(os.path.dirname(TRAINING_STATUS_FILE), exist_ok=True)
-            with open(TRAINING_STATUS_FILE, 'w') as f:
-                json.dump(status, f, indent=2)
+            self._save_status(status)
+            with self._state_lock:
+                self.last_trained_count = current_count
+                self._last_trained_size = file_size
+                self.last_accuracy = metrics['cv_accuracy_mean']
             
-            # Try to log to Supabase (if available)
-            try:
-                from supabase_client import log_training
-                log_training(
-                    total_sms=current_count,
-                    accuracy=metrics['cv_accuracy_mean'],
-                    f1=metrics['f1_weighted'],
-                    triggered_by=triggered_by,
-                    new_sms_count=new_count,
-                )
-            except Exception as e:
-                print(f"[AutoTrainer] Supabase log failed (non-critical): {e}")
+            # Log to Supabase (if available) without holding up the trainer
+            _log_pool.submit(
+                _log_training_remote,
+                total_sms=current_count,
+                accuracy=metrics['cv_accuracy_mean'],
+                f1=metrics['f1_weighted'],
+                triggered_by=triggered_by,
+                new_sms_count=new_count,
+            ).add_done_callback(_report_log_failure)
             
-            print(f"[AutoTrainer] ✅ Retraining complete!")
-            print(f"[AutoTrainer] Accuracy: {metrics['cv_accuracy_mean']:.4f}")
-            print(f"[AutoTrainer] F1-Score: {metrics['f1_weighted']:.4f}")
+            log.info("✅ Retraining complete!")
+            log.info("Accuracy: %.4f", metrics['cv_accuracy_mean'])
+            log.info("F1-Score: %.4f", metrics['f1_weighted'])
             
             return {
                 'status': 'completed',
@@ -138,34 +420,114 @@ class AutoTrainer:
             }
             
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            log.exception("Retraining failed")
             return {'status': 'failed', 'error': str(e)}
         finally:
-            self.is_training = False
+            with self._state_lock:
+                self._state = State.IDLE
+                self._status_reply = None
+    
+    def _on_sms_file_changed(self):
+        """
+        Called from the watchdog thread when the SMS file is written. Only
+        wakes the monitor: the server's own appends already updated the
+        cached count (appending()), and get_sms_count() recounts after
+        any other write because the file's mtime no longer matches.
+        """
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                pass  # Event loop already closed (shutdown in progress)
+    
+    def _start_watcher(self):
+        """Watch the SMS file so the monitor wakes on writes instead of polling."""
+        if not HAS_WATCHDOG or self._observer is not None:
+            return
+        try:
+            observer = Observer()
+            observer.schedule(_SmsFileHandler(self), BASE_DIR, recursive=False)
+            observer.start()
+            self._observer = observer
+        except Exception as e:
+            log.warning("File watcher failed, falling back to polling: %s", e)
+            self._observer = None
+    
+    def _stop_watcher(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
     
-    def _background_loop(self):
-        """Background thread that checks retrain threshold periodically."""
-        print(f"[AutoTrainer] 🚀 Background monitor started (threshold: {RETRAIN_THRESHOLD} SMS)")
-        while not self._stop_event.is_set():
-            if self.should_retrain():
-                self.retrain(triggered_by='threshold')
-            self._stop_event.wait(CHECK_INTERVAL)
+    def _check_threshold(self) -> Optional[int]:
+        """
+        Start a retrain if the threshold is met; returns the SMS count. It
+        stats and may recount the SMS file, so the monitor runs it in a thread.
+        """
+        count = self.get_sms_count()
+        if self.should_retrain():
+            self.start_retrain(triggered_by='threshold')
+        return count
+    
+    async def _monitor_loop(self):
+        """Background task that checks the retrain threshold on SMS file writes."""
+        mode = "file watcher" if self._observer is not None else "adaptive polling"
+        log.info("🚀 Background monitor started (threshold: %d SMS, %s)", RETRAIN_THRESHOLD, mode)
+        last_seen = None
+        while True:
+            count = None
+            try:
+                count = await asyncio.to_thread(self._check_threshold)
+            except Exception as e:
+                log.warning("Threshold check failed: %s", e)
+            if self._observer is not None:
+                timeout = HEARTBEAT_INTERVAL
+            else:
+                # Poll quickly while SMS are flowing, back off exponentially when idle
+                if count is not None and count != last_seen:
+                    self._idle_backoff = ACTIVE_CHECK_INTERVAL
+                else:
+                    self._idle_backoff = min(self._idle_backoff * 2, MAX_IDLE_BACKOFF)
+                last_seen = count
+                timeout = self._idle_backoff + random.uniform(0, BACKOFF_JITTER)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                # A single save fires several events (truncate, write, close)
+                await asyncio.sleep(WATCH_DEBOUNCE)
+            self._wake.clear()
     
     def start_background(self):
-        """Start background monitoring thread."""
-        if self._thread and self._thread.is_alive():
+        """Start background monitoring as a task on the running event loop."""
+        if self._task is not None and not self._task.done():
             return
-        self._stop_event.clear()
-        self._thread = threading.Thread(target=self._background_loop, daemon=True)
-        self._thread.start()
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._start_watcher()
+        self._task = self._loop.create_task(self._monitor_loop())
     
     def stop_background(self):
         """Stop background monitoring."""
-        self._stop_event.set()
-        if self._thread:
-            self._thread.join(timeout=5)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stop_watcher()
+        self._loop = self._wake = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
 
 # Singleton instance
-trainer = AutoTrainer()
+_trainer: Optional[AutoTrainer] = None
+
+
+def get_trainer() -> AutoTrainer:
+    """Shared AutoTrainer, created on first use rather than at import time."""
+    global _trainer
+    if _trainer is None:
+        _trainer = AutoTrainer()
+    return _trainer
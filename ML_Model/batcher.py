@@ -0,0 +1,66 @@
+"""
+batcher.py — Dynamic Request Batching
+======================================
+Coalesces work submitted by concurrent requests into one call of a batch
+function. A batch is dispatched when it reaches max_batch_size items or
+max_delay seconds after its first item arrived, whichever comes first,
+and runs in a worker thread so the event loop stays free.
+"""
+
+import asyncio
+from typing import Callable, List, Optional
+
+
+class DynamicBatcher:
+    """
+    Wraps fn(items) -> results (one result per item, same order).
+    Callers await submit(items) and get back just their own slice.
+    """
+
+    def __init__(self, fn: Callable[[list], list], max_batch_size: int = 64, max_delay: float = 0.05):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue: List[tuple] = []  # (items, future) per caller
+        self._queued_items = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()  # Keep running batches referenced until done
+
+    async def submit(self, items: list) -> list:
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((items, future))
+        self._queued_items += len(items)
+        if self._queued_items >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        queue, self._queue, self._queued_items = self._queue, [], 0
+        if not queue:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(queue))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, queue: List[tuple]):
+        items = [item for chunk, _ in queue for item in chunk]
+        try:
+            results = await asyncio.to_thread(self.fn, items)
+        except Exception as e:
+            for _, future in queue:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        pos = 0
+        for chunk, future in queue:
+            if not future.done():
+                future.set_result(results[pos:pos + len(chunk)])
+            pos += len(chunk)
@@ -7,32 +7,70 @@ auto-retraining triggers, and web-crawled data.
 
 import os
 import sys
-import json
+import asyncio
 import hashlib
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from operator import itemgetter
 from datetime import datetime
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
 
+import orjson
 from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
+# Modules that log (auto_trainer) keep the "[Tag] message" console format
+logging.basicConfig(level=logging.INFO, format='[%(name)s] %(message)s')
+
 # Add project root to path for pipeline imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from pipeline.labeler import label_sms
-from pipeline.preprocessor import preprocess_single_sms, clean_text
-from pipeline.extractor import extract_transaction
-from pipeline.fraud_detector import detect_spam, detect_anomaly, analyze_sms
-from pipeline.analytics import compute_analytics
-from auto_trainer import trainer as auto_trainer
+from pipeline.preprocessor import preprocess_batch, clean_text
+from pipeline.extractor import extract_transactions_batch
+from pipeline.fraud_detector import detect_spam, detect_anomaly, analyze_batch, summarize_history
+from pipeline.analytics import AnalyticsRollup, compute_analytics_periods
+from pipeline.storage import (
+    read_records, append_records, write_records, filter_records,
+    migrate_legacy_json,
+)
+from pipeline.transaction_store import TransactionStore
+from auto_trainer import get_trainer
+from batcher import DynamicBatcher
 
 # Lazy imports for optional deps
 try:
     from ollama_model import OllamaModel
-    llm = OllamaModel(model_name="vicuna:13b")
-except Exception as e:
+    HAS_LLM = True
+except ImportError as e:
+    HAS_LLM = False
     print(f"[LLM] Ollama not available: {e}")
-    llm = None
+
+LLM_MODEL_NAME = "vicuna:13b"
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    """
+    The Ollama model, connected (and pulled, if missing) on first use
+    rather than at import, so startup and every uvicorn worker that never
+    serves an AI request skip it. Returns None if Ollama is unreachable;
+    the next call tries again.
+    """
+    global _llm
+    if _llm is None and HAS_LLM:
+        with _llm_lock:
+            if _llm is None:
+                try:
+                    _llm = OllamaModel(model_name=LLM_MODEL_NAME)
+                except Exception as e:
+                    print(f"[LLM] Ollama not available: {e}")
+    return _llm
 
 try:
     from web_crawler import crawler as web_crawler, should_crawl_web
@@ -48,23 +86,84 @@ except Exception as e:
     HAS_SUPABASE = False
     print(f"[Supabase] Not available: {e}")
 
-app = FastAPI(title="FinSight API", version="3.0")
+class ORJSONResponse(JSONResponse):
+    """JSON responses rendered with orjson (several times faster than stdlib json)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+app = FastAPI(title="FinSight API", version="3.0", default_response_class=ORJSONResponse)
 
 # ─── Storage (file-based fallback) ──────────────────────────────────────
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
-SMS_RAW_FILE = os.path.join(os.path.dirname(__file__), "sms_data.json")
-TRANSACTIONS_FILE = os.path.join(DATA_DIR, "transactions.json")
-PROCESSED_FILE = os.path.join(DATA_DIR, "processed_sms.json")
-USERS_FILE = os.path.join(DATA_DIR, "users.json")
+SMS_RAW_FILE = os.path.join(os.path.dirname(__file__), "sms_data.jsonl")
+LEGACY_SMS_RAW_FILE = os.path.join(os.path.dirname(__file__), "sms_data.json")
+TRANSACTIONS_DB = os.path.join(DATA_DIR, "transactions.db")
+TRANSACTIONS_FILE = os.path.join(DATA_DIR, "transactions.jsonl")  # Pre-SQLite store, imported once
+LEGACY_TRANSACTIONS_FILE = os.path.join(DATA_DIR, "transactions.json")
+PROCESSED_FILE = os.path.join(DATA_DIR, "processed_sms.jsonl")
+LEGACY_PROCESSED_FILE = os.path.join(DATA_DIR, "processed_sms.json")
+USERS_FILE = os.path.join(DATA_DIR, "users.jsonl")
+LEGACY_USERS_FILE = os.path.join(DATA_DIR, "users.json")
+TXN_HASH_SIZE = 16  # Dedup key only, not a security boundary — 128 bits is plenty
+
+# Transactions live in SQLite; the UNIQUE content hash column does the dedup
+txn_store = TransactionStore(TRANSACTIONS_DB)
+
+# Taken by processed/transaction writers; a full reprocess holds it while
+# its pipeline runs in a thread, so no write is lost to its rewrite
+_store_lock = asyncio.Lock()
+
+# Keys of every stored raw SMS _id (built by the startup dedup pass)
+_sms_ids = set()
+
+# Taken around raw-SMS dedup and the append (which runs in a thread), and
+# by anything that reads or rewrites the raw SMS file
+_raw_sms_lock = asyncio.Lock()
+
+
+def _append_raw_sms(records: List[dict]):
+    """Append new raw SMS, moving the trainer's cached count with them."""
+    with get_trainer().appending(len(records)):
+        append_records(SMS_RAW_FILE, records)
+
+# The processed-SMS file is an offline record the API never reads back, so
+# requests buffer their rows here and a background task appends them
+PROCESSED_FLUSH_INTERVAL = 0.2  # seconds
+_processed_pending: List[dict] = []
+_processed_flusher: Optional[asyncio.Task] = None
+
+
+async def _flush_processed():
+    """Append every buffered processed SMS in one write, off the event loop."""
+    async with _store_lock:  # Ordered against clear/reprocess rewriting the file
+        if not _processed_pending:
+            return
+        batch = _processed_pending[:]
+        _processed_pending.clear()
+        try:
+            await asyncio.to_thread(append_records, PROCESSED_FILE, batch)
+        except BaseException:
+            _processed_pending[:0] = batch  # Keep them for the next flush
+            raise
 
 
-def _load_json(path: str) -> list:
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            return json.load(f)
-    return []
+async def _flush_processed_forever():
+    while True:
+        await asyncio.sleep(PROCESSED_FLUSH_INTERVAL)
+        try:
+            await _flush_processed()
+        except Exception as e:
+            print(f"[Storage] Processed SMS flush failed, will retry: {e}")
+
+# File-fallback users (loaded at startup, kept in sync on signup). Every
+# record in users.jsonl stays reachable by id; the email index holds the
+# latest record per email, since a re-signup appends a replacement.
+_users_by_email: Dict[str, dict] = {}
+_users_by_id: Dict[str, dict] = {}
 
 
 def _safe_float(val) -> float:
@@ -77,35 +176,188 @@ def _safe_float(val) -> float:
         return 0.0
 
 
-def _save_json(path: str, data: list):
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def _index_user(user: dict):
+    # A later record for an email replaces the earlier one in the email
+    # index (and moves to the end, as a re-signup did before)
+    _users_by_email.pop(user.get('email'), None)
+    _users_by_email[user.get('email')] = user
+    _users_by_id[user.get('id')] = user
 
 
-def _transaction_hash(txn: dict) -> str:
-    """Content-based dedup key: SHA-256 of amount|date|type|sender|bank."""
-    parts = [
-        str(_safe_float(txn.get('amount', 0))),
-        str(txn.get('transaction_date', '')),
-        str(txn.get('transaction_type', '')),
-        str(txn.get('sender', '')),
-        str(txn.get('bank_name', '')),
-        str(txn.get('counterparty', '')),
-    ]
-    key = '|'.join(parts)
-    return hashlib.sha256(key.encode()).hexdigest()
+def _load_users():
+    _users_by_email.clear()
+    _users_by_id.clear()
+    for u in read_records(USERS_FILE):
+        _index_user(u)
 
 
-def _deduplicate_transactions(transactions: list) -> list:
-    """Remove duplicate transactions by content hash. Keeps first occurrence."""
-    seen_hashes = set()
-    unique = []
-    for txn in transactions:
-        h = _transaction_hash(txn)
-        if h not in seen_hashes:
-            seen_hashes.add(h)
-            unique.append(txn)
-    return unique
+def _save_user(user: dict):
+    """Record a new or replaced user — one appended line, not a full rewrite."""
+    _index_user(user)
+    append_records(USERS_FILE, [user])
+
+
+# Last loaded transactions: (stamp, records). Read-only for callers.
+_txn_file_cache = (None, [])
+
+
+def _transactions_stamp() -> tuple:
+    """Version of the transactions table; changes on every insert, update or delete."""
+    return txn_store.stamp()
+
+
+def _load_transactions_snapshot() -> tuple:
+    """
+    (stamp, records) for the transactions table, re-loaded only when it
+    changed. The stamp is taken before reading, so the records are never
+    older than it. Callers must not mutate the shared records list.
+    """
+    global _txn_file_cache
+    stamp = _transactions_stamp()
+    cached_stamp, records = _txn_file_cache
+    if cached_stamp != stamp:
+        records = txn_store.all()
+        _txn_file_cache = (stamp, records)
+    return stamp, records
+
+
+def _load_transactions() -> list:
+    return _load_transactions_snapshot()[1]
+
+
+def _sms_key(sid):
+    """
+    Dedup key for an SMS _id. Android SMS row ids arrive as digit strings;
+    as ints they hash without touching string bytes and are smaller in the
+    set. Anything else (including zero-padded ids) stays a string.
+    """
+    if isinstance(sid, int):
+        return sid
+    sid = str(sid)
+    if sid.isascii() and sid.isdigit() and (sid[0] != '0' or sid == '0'):
+        return int(sid)
+    return sid
+
+
+def _transaction_hash(txn: dict) -> bytes:
+    """Content-based dedup key: 128-bit BLAKE2b of amount|date|type|sender|bank|counterparty."""
+    key = (
+        f"{_safe_float(txn.get('amount', 0))}|{txn.get('transaction_date', '')}|"
+        f"{txn.get('transaction_type', '')}|{txn.get('sender', '')}|"
+        f"{txn.get('bank_name', '')}|{txn.get('counterparty', '')}"
+    )
+    return hashlib.blake2b(key.encode(), digest_size=TXN_HASH_SIZE).digest()
+
+
+# Anomaly baseline over the stored transactions: (store stamp, HistorySummary).
+# Built once, then advanced in place as transactions are inserted. Any other
+# change to the store moves the stamp, and it is rebuilt on next use.
+_anomaly_state = (None, None)
+_anomaly_lock = threading.Lock()  # Scoring and inserts both run in worker threads
+
+
+def _anomaly_summary():
+    """Current anomaly baseline. Call with _anomaly_lock held."""
+    global _anomaly_state
+    stamp, summary = _anomaly_state
+    if summary is None or stamp != _transactions_stamp():
+        stamp, records = _load_transactions_snapshot()
+        summary = summarize_history(records)
+        _anomaly_state = (stamp, summary)
+    return summary
+
+
+# Analytics totals over the stored transactions: (store stamp, AnalyticsRollup).
+# Kept current the same way as the anomaly baseline, so the analytics
+# endpoints read running totals instead of re-walking every transaction.
+_rollup_state = (None, None)
+_rollup_lock = threading.Lock()  # Analytics reads and inserts both run in the threadpool
+
+
+def _analytics_rollup() -> tuple:
+    """(stamp, current AnalyticsRollup). Call with _rollup_lock held."""
+    global _rollup_state
+    stamp, rollup = _rollup_state
+    if rollup is None or stamp != _transactions_stamp():
+        stamp, records = _load_transactions_snapshot()
+        rollup = AnalyticsRollup.from_transactions(records)
+        _rollup_state = (stamp, rollup)
+    return stamp, rollup
+
+
+def _insert_transactions(candidates: list) -> list:
+    """
+    txn_store.insert_new(), folding the inserted transactions into the
+    anomaly baseline and the analytics rollup. Waits on locks that rebuilds
+    hold for a full store scan, so callers run it in the threadpool.
+    """
+    global _anomaly_state, _rollup_state
+    with _anomaly_lock, _rollup_lock:
+        before = _transactions_stamp()
+        inserted = txn_store.insert_new(candidates)
+        after = _transactions_stamp()
+        stamp, summary = _anomaly_state
+        if summary is not None and stamp == before:
+            for txn in inserted:
+                summary.add(txn)
+            _anomaly_state = (after, summary)
+        stamp, rollup = _rollup_state
+        if rollup is not None and stamp == before:
+            rollup.extend(inserted)
+            _rollup_state = (after, rollup)
+    return inserted
+
+
+def _analyze_sms_batch(sms_list: list) -> list:
+    """
+    Run the ML pipeline over new SMS. CPU-bound, so callers run it in the
+    threadpool. Returns (enriched_sms, transaction_or_None) per SMS.
+    """
+    enriched_list = preprocess_batch(sms_list)
+    fraud_list = analyze_batch(sms_list)
+    for enriched, fraud_result in zip(enriched_list, fraud_list):
+        enriched['is_spam'] = fraud_result['is_spam']
+        enriched['is_genuine'] = fraud_result['is_genuine']
+        enriched['fraud_type'] = fraud_result.get('fraud_type')
+    
+    # Genuine financial SMS are extracted together (columnar scans)
+    financial = [i for i, enriched in enumerate(enriched_list)
+                 if enriched.get('label') == 'financial_transaction' and enriched.get('is_genuine', True)]
+    txns = [None] * len(sms_list)
+    for i, txn in zip(financial, extract_transactions_batch(sms_list[i] for i in financial)):
+        if txn.get('transaction_type') is not None:
+            enriched = enriched_list[i]
+            txn['label'] = enriched['label']
+            txn['sub_label'] = enriched['sub_label']
+            txn['label_confidence'] = enriched['label_confidence']
+            txns[i] = txn
+    results = list(zip(enriched_list, txns))
+    
+    # Score against the running baseline (inserts wait, so it stays consistent)
+    with _anomaly_lock:
+        history_stats = _anomaly_summary()
+        for _, txn in results:
+            if txn is not None:
+                anomaly = detect_anomaly(txn, history_stats=history_stats)
+                txn['is_anomaly'] = anomaly['is_anomaly']
+                txn['anomaly_score'] = anomaly['anomaly_score']
+    return results
+
+
+# Concurrent /api/sms requests share one pipeline pass (and one history load)
+sms_batcher = DynamicBatcher(_analyze_sms_batch, max_batch_size=64, max_delay=0.05)
+
+
+# Fire-and-forget tasks are held here so they aren't garbage-collected mid-run
+_background_tasks = set()
+
+
+def _store_chat_turn(user_id: str, user_query: str, response: str):
+    try:
+        supa.store_chat_message(user_id, "user", user_query)
+        supa.store_chat_message(user_id, "assistant", response)
+    except Exception as e:
+        print(f"[Supabase] Chat history store failed: {e}")
 
 
 # ─── Pydantic Models ───────────────────────────────────────────────────
@@ -151,43 +403,66 @@ async def startup_event():
     print("\n" + "="*60)
     print("   🚀 FinSight API v3.0 — Starting Up")
     print("="*60)
-    auto_trainer.start_background()
+    for legacy, path in ((LEGACY_SMS_RAW_FILE, SMS_RAW_FILE),
+                         (LEGACY_PROCESSED_FILE, PROCESSED_FILE),
+                         (LEGACY_USERS_FILE, USERS_FILE)):
+        if migrate_legacy_json(legacy, path):
+            print(f"[Startup] Migrated {legacy} to JSONL")
+    _load_users()
+    get_trainer().start_background()
+    global _processed_flusher
+    _processed_flusher = asyncio.create_task(_flush_processed_forever())
     
-    # Deduplicate existing transactions on startup
-    txns = _load_json(TRANSACTIONS_FILE)
-    if txns:
-        deduped = _deduplicate_transactions(txns)
-        if len(deduped) < len(txns):
-            _save_json(TRANSACTIONS_FILE, deduped)
-            print(f"[Startup] Cleaned {len(txns) - len(deduped)} duplicate transactions")
-            print(f"[Startup] {len(deduped)} unique transactions remain")
-        else:
-            print(f"[Startup] {len(txns)} transactions — no duplicates found")
+    # First run on SQLite: import the old JSONL/JSON transactions file once.
+    # Duplicates are dropped by the UNIQUE hash (first occurrence wins); the
+    # old file is left in place as a backup.
+    if txn_store.created:
+        for path in (TRANSACTIONS_FILE, LEGACY_TRANSACTIONS_FILE):
+            if os.path.exists(path):
+                txns = read_records(path)
+                kept = txn_store.insert_new((_transaction_hash(t), t) for t in txns)
+                print(f"[Startup] Imported {len(kept)} transactions from {path} "
+                      f"({len(txns) - len(kept)} duplicates dropped)")
+                break
+    print(f"[Startup] {txn_store.count()} transactions stored")
     
-    # Also dedup raw SMS
-    raw = _load_json(SMS_RAW_FILE)
-    if raw:
-        seen_ids = set()
-        unique_raw = []
-        for s in raw:
-            sid = str(s.get('_id', ''))
-            if sid and sid not in seen_ids:
-                seen_ids.add(sid)
-                unique_raw.append(s)
-            elif not sid:
-                unique_raw.append(s)
-        if len(unique_raw) < len(raw):
-            _save_json(SMS_RAW_FILE, unique_raw)
-            print(f"[Startup] Cleaned {len(raw) - len(unique_raw)} duplicate raw SMS")
+    # Also dedup raw SMS (streamed: SMS without an _id are always kept,
+    # otherwise the first occurrence wins). The surviving ids seed _sms_ids.
+    _sms_ids.clear()
+
+    def _first_occurrence(sms: dict) -> bool:
+        sid = sms.get('_id')
+        if sid is None or sid == '':
+            return True
+        key = _sms_key(sid)
+        if key in _sms_ids:
+            return False
+        _sms_ids.add(key)
+        return True
+
+    removed = filter_records(SMS_RAW_FILE, _first_occurrence)
+    if removed:
+        trainer = get_trainer()
+        trainer.invalidate_count()
+        trainer.discard_preprocessed_cache()
+        print(f"[Startup] Cleaned {removed} duplicate raw SMS")
     
     print(f"[Storage] SMS file: {SMS_RAW_FILE}")
-    print(f"[Storage] Transactions file: {TRANSACTIONS_FILE}")
+    print(f"[Storage] Transactions DB: {TRANSACTIONS_DB}")
     print(f"[Supabase] Available: {HAS_SUPABASE}")
-    print(f"[LLM] Available: {llm is not None}")
+    print(f"[LLM] Available: {HAS_LLM} (model {LLM_MODEL_NAME} loads on first use)")
     print(f"[WebCrawler] Available: {HAS_CRAWLER}")
     print()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _processed_flusher is not None:
+        _processed_flusher.cancel()
+    await _flush_processed()
+    get_trainer().stop_background()
+
+
 # ═══════════════════════════════════════════════════════════════════════
 # AUTH ENDPOINTS (GoTrue + file fallback)
 # ═══════════════════════════════════════════════════════════════════════
@@ -209,7 +484,6 @@ async def signup(request: SignupRequest):
             )
             if supa_user and supa_user.get('id'):
                 # Also save to file for offline fallback
-                users = _load_json(USERS_FILE)
                 file_user = {
                     "id": supa_user['id'],
                     "email": request.email,
@@ -217,9 +491,7 @@ async def signup(request: SignupRequest):
                     "password_hash": _hash_password(request.password),
                     "created_at": datetime.now().isoformat(),
                 }
-                users = [u for u in users if u.get('email') != request.email]
-                users.append(file_user)
-                _save_json(USERS_FILE, users)
+                _save_user(file_user)
                 
                 safe_user = {k: v for k, v in file_user.items() if k != "password_hash"}
                 return {"status": "ok", "user": safe_user}
@@ -231,10 +503,8 @@ async def signup(request: SignupRequest):
             print(f"[Auth] Supabase signup error, falling back to file: {e}")
     
     # File-based fallback
-    users = _load_json(USERS_FILE)
-    for u in users:
-        if u.get("email") == request.email:
-            raise HTTPException(status_code=409, detail="Email already registered")
+    if request.email in _users_by_email:
+        raise HTTPException(status_code=409, detail="Email already registered")
     
     import uuid
     user = {
@@ -244,8 +514,7 @@ async def signup(request: SignupRequest):
         "password_hash": _hash_password(request.password),
         "created_at": datetime.now().isoformat(),
     }
-    users.append(user)
-    _save_json(USERS_FILE, users)
+    _save_user(user)
     
     safe_user = {k: v for k, v in user.items() if k != "password_hash"}
     return {"status": "ok", "user": safe_user}
@@ -267,16 +536,13 @@ async def login(request: LoginRequest):
             print(f"[Auth] Supabase login error, falling back to file: {e}")
     
     # File-based fallback
-    users = _load_json(USERS_FILE)
-    for u in users:
-        if u.get("email") == request.email:
-            if u.get("password_hash") == _hash_password(request.password):
-                safe_user = {k: v for k, v in u.items() if k != "password_hash"}
-                return {"status": "ok", "user": safe_user}
-            else:
-                raise HTTPException(status_code=401, detail="Invalid password")
-    
-    raise HTTPException(status_code=404, detail="User not found")
+    u = _users_by_email.get(request.email)
+    if u is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if u.get("password_hash") != _hash_password(request.password):
+        raise HTTPException(status_code=401, detail="Invalid password")
+    safe_user = {k: v for k, v in u.items() if k != "password_hash"}
+    return {"status": "ok", "user": safe_user}
 
 
 @app.get("/api/auth/user/{user_id}")
@@ -290,12 +556,11 @@ async def get_user(user_id: str):
         except Exception as e:
             print(f"[Auth] Supabase get user error: {e}")
     
-    users = _load_json(USERS_FILE)
-    for u in users:
-        if u.get("id") == user_id:
-            safe_user = {k: v for k, v in u.items() if k != "password_hash"}
-            return {"user": safe_user}
-    raise HTTPException(status_code=404, detail="User not found")
+    u = _users_by_id.get(user_id)
+    if u is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    safe_user = {k: v for k, v in u.items() if k != "password_hash"}
+    return {"user": safe_user}
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -315,88 +580,70 @@ async def receive_sms(payload: SmsPayload):
         
         user_id = payload.user_id
 
-        # Step 1: Dedup raw SMS by _id
-        existing_raw = _load_json(SMS_RAW_FILE)
-        existing_ids = {str(s.get('_id', '')) for s in existing_raw if s.get('_id')}
-        new_raw = [s for s in sms_list if str(s.get('_id', '')) not in existing_ids]
-        
-        if not new_raw:
-            return {
-                "status": "ok",
-                "message": "All SMS already processed",
-                "count": len(sms_list),
-                "new_sms": 0,
-                "transactions_found": 0,
-            }
-        
-        existing_raw.extend(new_raw)
-        _save_json(SMS_RAW_FILE, existing_raw)
+        # Step 1: Dedup raw SMS by _id (also within this batch) and save the
+        # new ones. The ids are recorded only once the append has landed.
+        async with _raw_sms_lock:
+            new_raw = []
+            new_keys = set()
+            for s in sms_list:
+                sid = s.get('_id')
+                if not sid:
+                    new_raw.append(s)
+                    continue
+                key = _sms_key(sid)
+                if key not in _sms_ids and key not in new_keys:
+                    new_keys.add(key)
+                    new_raw.append(s)
+            
+            if not new_raw:
+                return {
+                    "status": "ok",
+                    "message": "All SMS already processed",
+                    "count": len(sms_list),
+                    "new_sms": 0,
+                    "transactions_found": 0,
+                }
+            
+            await asyncio.to_thread(_append_raw_sms, new_raw)
+            _sms_ids.update(new_keys)
 
         # Step 2: Store to Supabase with dedup (if available)
         new_sms_count = 0
         if HAS_SUPABASE and user_id:
-            new_sms_count = supa.store_sms_batch(user_id, new_raw)
+            new_sms_count = await run_in_threadpool(supa.store_sms_batch, user_id, new_raw)
             print(f"[Supabase] {new_sms_count} new SMS stored (deduped)")
 
-        # Step 3: Process ONLY new SMS through pipeline
+        # Step 3: Process ONLY new SMS through pipeline (batched, off the event loop)
+        results = await sms_batcher.submit(new_raw)
+
         processed = []
-        transactions = []
+        candidates = []
         spam_count = 0
-
-        existing_transactions = _load_json(TRANSACTIONS_FILE)
-        existing_hashes = {_transaction_hash(t) for t in existing_transactions}
-
-        for sms in new_raw:
-            enriched = preprocess_single_sms(sms)
-            fraud_result = analyze_sms(sms)
-            enriched['is_spam'] = fraud_result['is_spam']
-            enriched['is_genuine'] = fraud_result['is_genuine']
-            enriched['fraud_type'] = fraud_result.get('fraud_type')
-            
-            if fraud_result['is_spam']:
+        for enriched, txn in results:
+            if enriched['is_spam']:
                 spam_count += 1
-            
             processed.append(enriched)
-            
-            if enriched.get('label') == 'financial_transaction' and enriched.get('is_genuine', True):
-                txn = extract_transaction(sms)
-                
-                if txn.get('transaction_type') is None:
-                    continue
-                    
-                txn['label'] = enriched['label']
-                txn['sub_label'] = enriched['sub_label']
-                txn['label_confidence'] = enriched['label_confidence']
-                
-                anomaly = detect_anomaly(txn, existing_transactions)
-                txn['is_anomaly'] = anomaly['is_anomaly']
-                txn['anomaly_score'] = anomaly['anomaly_score']
-                
-                # Content-hash dedup: skip if identical transaction exists
-                txn_hash = _transaction_hash(txn)
-                if txn_hash in existing_hashes:
-                    continue
-                
-                existing_hashes.add(txn_hash)
-                transactions.append(txn)
-                
-                # Store to Supabase
-                if HAS_SUPABASE and user_id:
-                    supa.store_transaction(user_id, txn)
+            if txn is not None:
+                candidates.append((_transaction_hash(txn), txn))
 
-        # Step 4: Save to file
-        existing_processed = _load_json(PROCESSED_FILE)
-        existing_processed.extend(processed)
-        _save_json(PROCESSED_FILE, existing_processed)
+        # Step 4: Save. The store skips transactions whose content hash is
+        # already present, and returns only the ones it inserted. The
+        # processed rows are flushed to disk in the background.
+        async with _store_lock:
+            _processed_pending.extend(processed)
+            transactions = await run_in_threadpool(_insert_transactions, candidates)
+            _invalidate_user_caches(user_id)
 
-        existing_transactions.extend(transactions)
-        _save_json(TRANSACTIONS_FILE, existing_transactions)
+        # Store to Supabase
+        if HAS_SUPABASE and user_id and transactions:
+            await run_in_threadpool(supa.store_transactions_bulk, user_id, transactions)
 
         # Check auto-retrain
-        retrain_status = auto_trainer.get_status()
-        if auto_trainer.should_retrain():
+        trainer = get_trainer()
+        retrain_status = trainer.get_status()
+        if trainer.should_retrain():
             print("[AutoTrainer] Threshold met! Starting retrain...")
-            auto_trainer.retrain(triggered_by='threshold')
+            trainer.start_retrain(triggered_by='threshold')
 
         print(f"[SMS API] Received {len(sms_list)} SMS ({len(new_raw)} new) | "
               f"{len(transactions)} transactions | {spam_count} spam | "
@@ -409,8 +656,8 @@ async def receive_sms(payload: SmsPayload):
             "new_sms": len(new_raw),
             "transactions_found": len(transactions),
             "spam_detected": spam_count,
-            "total_raw": len(existing_raw),
-            "total_transactions": len(existing_transactions),
+            "total_raw": get_trainer().get_sms_count(),  # Cached; no file scan
+            "total_transactions": txn_store.count(),
             "retrain_progress": retrain_status['progress_to_retrain'],
         }
     except Exception as e:
@@ -422,16 +669,24 @@ async def receive_sms(payload: SmsPayload):
 @app.get("/api/sms")
 async def get_all_sms():
     """Retrieve all stored raw SMS."""
-    data = _load_json(SMS_RAW_FILE)
+    async with _raw_sms_lock:
+        data = await asyncio.to_thread(read_records, SMS_RAW_FILE)
     return {"data": data, "count": len(data)}
 
 
 @app.delete("/api/sms")
 async def clear_sms():
     """Clear all stored SMS and processed data."""
-    _save_json(SMS_RAW_FILE, [])
-    _save_json(PROCESSED_FILE, [])
-    _save_json(TRANSACTIONS_FILE, [])
+    async with _store_lock, _raw_sms_lock:
+        await asyncio.to_thread(write_records, SMS_RAW_FILE, [])
+        _sms_ids.clear()
+        trainer = get_trainer()
+        trainer.invalidate_count()
+        trainer.discard_preprocessed_cache()
+        _processed_pending.clear()
+        await asyncio.to_thread(write_records, PROCESSED_FILE, [])
+        await asyncio.to_thread(txn_store.replace_all, [])
+        _clear_user_caches()
     return {"status": "ok", "message": "All data cleared"}
 
 
@@ -446,7 +701,7 @@ async def get_transactions(user_id: Optional[str] = None):
         data = supa.get_user_transactions(user_id)
         return {"data": data, "count": len(data)}
     
-    data = _load_json(TRANSACTIONS_FILE)
+    data = _load_transactions()
     return {"data": data, "count": len(data)}
 
 
@@ -456,17 +711,15 @@ async def update_category(txn_id: int, update: CategoryUpdate):
     if HAS_SUPABASE and update.user_id:
         result = supa.update_transaction_category(txn_id, update.category, update.user_id)
         if result:
+            _invalidate_user_caches(update.user_id)
             return {"status": "ok", "transaction": result}
         raise HTTPException(status_code=404, detail="Transaction not found")
     
     # File fallback
-    transactions = _load_json(TRANSACTIONS_FILE)
-    for txn in transactions:
-        if str(txn.get('sms_id')) == str(txn_id):
-            txn['category'] = update.category
-            txn['category_edited'] = True
-            _save_json(TRANSACTIONS_FILE, transactions)
-            return {"status": "ok", "transaction": txn}
+    txn = txn_store.update_category(txn_id, update.category)
+    if txn is not None:
+        _invalidate_user_caches()
+        return {"status": "ok", "transaction": txn}
     
     raise HTTPException(status_code=404, detail="Transaction not found")
 
@@ -496,54 +749,74 @@ async def get_categories():
     return {"categories": default}
 
 
-@app.post("/api/sms/process")
-async def reprocess_all_sms():
-    """Re-process all stored raw SMS through the ML pipeline with dedup."""
-    try:
-        raw_sms = _load_json(SMS_RAW_FILE)
-        if not raw_sms:
-            return {"status": "ok", "message": "No SMS to process"}
+def _reprocess_sms(raw_sms: list) -> tuple:
+    """
+    CPU-bound part of a full reprocess, run in a worker thread.
+    Returns (processed, [(hash, transaction)], spam_count).
+    """
+    processed = []
+    spam_count = 0
+    seen_hashes = set()
+    items = []
 
-        processed = []
-        transactions = []
-        spam_count = 0
-        seen_hashes = set()
+    enriched_list = preprocess_batch(raw_sms)
+    fraud_list = analyze_batch(raw_sms)
+    financial = []
+    for sms, enriched, fraud_result in zip(raw_sms, enriched_list, fraud_list):
+        enriched['is_spam'] = fraud_result['is_spam']
+        enriched['is_genuine'] = fraud_result['is_genuine']
 
-        for sms in raw_sms:
-            enriched = preprocess_single_sms(sms)
-            fraud_result = analyze_sms(sms)
-            enriched['is_spam'] = fraud_result['is_spam']
-            enriched['is_genuine'] = fraud_result['is_genuine']
+        if fraud_result['is_spam']:
+            spam_count += 1
 
-            if fraud_result['is_spam']:
-                spam_count += 1
+        processed.append(enriched)
 
-            processed.append(enriched)
+        if enriched.get('label') == 'financial_transaction' and enriched.get('is_genuine', True):
+            financial.append((sms, enriched))
 
-            if enriched.get('label') == 'financial_transaction' and enriched.get('is_genuine', True):
-                txn = extract_transaction(sms)
-                
-                if txn.get('transaction_type') is None:
-                    continue
-                    
-                txn['label'] = enriched['label']
-                txn['sub_label'] = enriched['sub_label']
-                txn['label_confidence'] = enriched['label_confidence']
-                
-                # Content-hash dedup
-                txn_hash = _transaction_hash(txn)
-                if txn_hash in seen_hashes:
-                    continue
-                seen_hashes.add(txn_hash)
-                transactions.append(txn)
+    # Extract the genuine financial SMS in columnar chunks, in order
+    txns = extract_transactions_batch(sms for sms, _ in financial)
+    for (_, enriched), txn in zip(financial, txns):
+        if txn.get('transaction_type') is None:
+            continue
+            
+        txn['label'] = enriched['label']
+        txn['sub_label'] = enriched['sub_label']
+        txn['label_confidence'] = enriched['label_confidence']
+        
+        # Content-hash dedup
+        txn_hash = _transaction_hash(txn)
+        if txn_hash in seen_hashes:
+            continue
+        seen_hashes.add(txn_hash)
+        items.append((txn_hash, txn))
+
+    return processed, items, spam_count
+
+
+@app.post("/api/sms/process")
+async def reprocess_all_sms():
+    """Re-process all stored raw SMS through the ML pipeline with dedup."""
+    try:
+        # Writers wait on the lock, so nothing lands between the read and
+        # the rewrite below while the pipeline runs off the event loop
+        async with _store_lock:
+            async with _raw_sms_lock:
+                raw_sms = await asyncio.to_thread(read_records, SMS_RAW_FILE)
+            if not raw_sms:
+                return {"status": "ok", "message": "No SMS to process"}
+
+            processed, items, spam_count = await asyncio.to_thread(_reprocess_sms, raw_sms)
 
-        _save_json(PROCESSED_FILE, processed)
-        _save_json(TRANSACTIONS_FILE, transactions)
+            _processed_pending.clear()  # Their raw SMS were just reprocessed
+            await asyncio.to_thread(write_records, PROCESSED_FILE, processed)
+            await asyncio.to_thread(txn_store.replace_all, items)
+            _clear_user_caches()
 
         return {
             "status": "ok",
             "total_processed": len(processed),
-            "transactions_found": len(transactions),
+            "transactions_found": len(items),
             "spam_detected": spam_count,
         }
     except Exception as e:
@@ -568,10 +841,8 @@ async def receive_notifications(payload: NotificationPayload):
             return {"status": "ok", "message": "No notifications", "count": 0}
         
         user_id = payload.user_id
-        existing_transactions = _load_json(TRANSACTIONS_FILE)
-        existing_hashes = {_transaction_hash(t) for t in existing_transactions}
         
-        new_transactions = []
+        candidates = []
         for notif in notifications:
             # Build transaction from notification data
             txn = {
@@ -593,20 +864,16 @@ async def receive_notifications(payload: NotificationPayload):
                 "anomaly_score": 0,
             }
             
-            # Content-hash dedup
-            txn_hash = _transaction_hash(txn)
-            if txn_hash in existing_hashes:
-                continue
-            
-            existing_hashes.add(txn_hash)
-            new_transactions.append(txn)
-            
-            # Store to Supabase
-            if HAS_SUPABASE and user_id:
-                supa.store_transaction(user_id, txn)
+            candidates.append((_transaction_hash(txn), txn))
         
-        existing_transactions.extend(new_transactions)
-        _save_json(TRANSACTIONS_FILE, existing_transactions)
+        # Content-hash dedup happens in the store
+        async with _store_lock:
+            new_transactions = await run_in_threadpool(_insert_transactions, candidates)
+            _invalidate_user_caches(user_id)
+        
+        # Store to Supabase
+        if HAS_SUPABASE and user_id and new_transactions:
+            await run_in_threadpool(supa.store_transactions_bulk, user_id, new_transactions)
         
         print(f"[Notifications] Received {len(notifications)} | "
               f"{len(new_transactions)} new transactions")
@@ -615,7 +882,7 @@ async def receive_notifications(payload: NotificationPayload):
             "status": "ok",
             "received": len(notifications),
             "new_transactions": len(new_transactions),
-            "total_transactions": len(existing_transactions),
+            "total_transactions": txn_store.count(),
         }
     except Exception as e:
         import traceback
@@ -627,35 +894,104 @@ async def receive_notifications(payload: NotificationPayload):
 # ANALYTICS ENDPOINTS
 # ═══════════════════════════════════════════════════════════════════════
 
+ANALYTICS_TTL = 30         # Seconds computed analytics stay valid (Supabase can change underneath)
+ANALYTICS_CACHE_SIZE = 4096
+ANALYTICS_PERIODS = ("weekly", "monthly", "quarterly", "yearly")
+
+# (user_id or None for the local file store, period) -> (computed_at, file stamp, analytics).
+# File-store entries stay valid while the transactions file is unchanged;
+# Supabase entries expire after ANALYTICS_TTL.
+_analytics_cache: dict = {}
+_analytics_epoch = 0  # Bumped on invalidation so in-flight results aren't cached stale
+_analytics_lock = asyncio.Lock()  # One computation at a time; waiters reuse its result
+
+
+def _invalidate_user_caches(user_id: Optional[str] = None):
+    """Drop a user's cached analytics and AI context after their transactions changed."""
+    global _analytics_epoch
+    _analytics_epoch += 1
+    for key in [k for k in _analytics_cache if k[0] in (user_id, None)]:
+        del _analytics_cache[key]  # The file-store entries cover everyone
+    _context_cache.pop(user_id, None)
+    _context_cache.pop(None, None)
+
+
+def _clear_user_caches():
+    global _analytics_epoch
+    _analytics_epoch += 1
+    _analytics_cache.clear()
+    _context_cache.clear()
+
+
+def _compute_analytics_periods(user_id: Optional[str], periods: List[str]) -> tuple:
+    """
+    Compute every requested period (runs in the threadpool). The local store
+    reads its running rollup; Supabase users are computed from a fresh fetch.
+    Returns (store stamp or None for Supabase, analytics by period).
+    """
+    if HAS_SUPABASE and user_id:
+        transactions = supa.get_user_transactions(user_id, limit=5000)
+        return None, compute_analytics_periods(transactions, periods)
+    with _rollup_lock:
+        stamp, rollup = _analytics_rollup()
+        return stamp, rollup.analytics(periods)
+
+
+def _cached_analytics(key: Optional[str], periods) -> Dict[str, dict]:
+    now = time.monotonic()
+    stamp = _transactions_stamp() if key is None else None
+    result = {}
+    for p in periods:
+        cached = _analytics_cache.get((key, p))
+        if not cached:
+            continue
+        computed_at, cached_stamp, analytics = cached
+        if key is None:
+            fresh = cached_stamp == stamp
+        else:
+            fresh = now - computed_at < ANALYTICS_TTL
+        if fresh:
+            result[p] = analytics
+    return result
+
+
+async def _get_analytics(user_id: Optional[str], periods) -> Dict[str, dict]:
+    key = user_id if HAS_SUPABASE and user_id else None
+    result = _cached_analytics(key, periods)
+    if len(result) < len(periods):
+        async with _analytics_lock:
+            # Another request may have filled the cache while we waited
+            result = _cached_analytics(key, periods)
+            missing = [p for p in periods if p not in result]
+            if missing:
+                # Analytics are pure Python, so threads wouldn't run the periods
+                # in parallel; one worker call keeps the event loop free instead
+                epoch = _analytics_epoch
+                now = time.monotonic()
+                stamp, computed = await run_in_threadpool(_compute_analytics_periods, user_id, missing)
+                if epoch == _analytics_epoch:
+                    for p, analytics in computed.items():
+                        if len(_analytics_cache) >= ANALYTICS_CACHE_SIZE:
+                            _analytics_cache.pop(next(iter(_analytics_cache)))  # Evict the oldest entry
+                        _analytics_cache[(key, p)] = (now, stamp, analytics)
+                result.update(computed)
+    return {p: result[p] for p in periods}
+
+
 @app.get("/api/analytics")
 async def get_analytics(
     period: str = Query(default="monthly", pattern="^(weekly|monthly|quarterly|yearly)$"),
     user_id: Optional[str] = None,
 ):
     """Get financial analytics."""
-    if HAS_SUPABASE and user_id:
-        transactions = supa.get_user_transactions(user_id, limit=5000)
-    else:
-        transactions = _load_json(TRANSACTIONS_FILE)
-    
-    analytics = compute_analytics(transactions, period)
-    return analytics
+    analytics = await _get_analytics(user_id, [period])
+    return analytics[period]
 
 
 @app.get("/api/analytics/summary")
 async def get_analytics_summary(user_id: Optional[str] = None):
     """Get quick summary of all analytics periods."""
-    if HAS_SUPABASE and user_id:
-        transactions = supa.get_user_transactions(user_id, limit=5000)
-    else:
-        transactions = _load_json(TRANSACTIONS_FILE)
-    
-    return {
-        "weekly": compute_analytics(transactions, "weekly"),
-        "monthly": compute_analytics(transactions, "monthly"),
-        "quarterly": compute_analytics(transactions, "quarterly"),
-        "yearly": compute_analytics(transactions, "yearly"),
-    }
+    return await _get_analytics(user_id, ANALYTICS_PERIODS)
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -665,54 +1001,70 @@ async def get_analytics_summary(user_id: Optional[str] = None):
 @app.get("/api/ml/status")
 async def ml_training_status():
     """Get current ML model training status."""
-    return auto_trainer.get_status()
+    return get_trainer().get_status()
 
 
 @app.post("/api/ml/retrain")
 async def trigger_retrain():
     """Manually trigger ML model retraining."""
-    result = auto_trainer.retrain(triggered_by="manual")
-    return result
+    future = get_trainer().start_retrain(triggered_by="manual")
+    if future is None:
+        return {'status': 'already_training'}
+    # Await the worker without blocking the event loop
+    return await asyncio.wrap_future(future)
 
 
 # ═══════════════════════════════════════════════════════════════════════
 # AI INSIGHTS ENDPOINTS
 # ═══════════════════════════════════════════════════════════════════════
 
+CONTEXT_TTL = 60           # Seconds a built financial context stays valid
+CONTEXT_CACHE_SIZE = 1024
+
+# user_id (None for the local file store) -> (built_at, context)
+_context_cache: dict = {}
+
+
 def _build_financial_context(user_id: Optional[str] = None) -> str:
-    """Build financial context for AI system prompt."""
+    """Build financial context for AI system prompt (cached for CONTEXT_TTL)."""
+    key = user_id if HAS_SUPABASE and user_id else None
+    cached = _context_cache.get(key)
+    now = time.monotonic()
+    if cached and now - cached[0] < CONTEXT_TTL:
+        return cached[1]
+    context = _compute_financial_context(user_id)
+    if len(_context_cache) >= CONTEXT_CACHE_SIZE:
+        _context_cache.pop(next(iter(_context_cache)))  # Evict the oldest entry
+    _context_cache[key] = (now, context)
+    return context
+
+
+def _compute_financial_context(user_id: Optional[str] = None) -> str:
     if HAS_SUPABASE and user_id:
         transactions = supa.get_user_transactions(user_id, limit=100)
     else:
-        transactions = _load_json(TRANSACTIONS_FILE)[-100:]
+        transactions = txn_store.last(100)
     
     if not transactions:
         return "No financial data available yet."
     
-    # Summarize
-    total_credit = sum(_safe_float(t.get('amount')) for t in transactions if t.get('transaction_type') == 'credit')
-    total_debit = sum(_safe_float(t.get('amount')) for t in transactions if t.get('transaction_type') == 'debit')
-    
-    # Category breakdown
-    categories = {}
+    # One pass; Counter/defaultdict keep the tallies in C. most_common() and
+    # sorted() are stable, so ties keep first-appearance order.
+    total_credit = total_debit = 0.0
+    categories = defaultdict(float)
+    methods = Counter()
+    merchants = Counter()
     for t in transactions:
-        cat = t.get('category', 'other')
         amt = _safe_float(t.get('amount'))
-        if t.get('transaction_type') == 'debit':
-            categories[cat] = categories.get(cat, 0) + amt
-    
-    # Payment methods
-    methods = {}
-    for t in transactions:
-        method = t.get('payment_method', 'other')
-        methods[method] = methods.get(method, 0) + 1
-    
-    # Top merchants
-    merchants = {}
-    for t in transactions:
-        cp = t.get('counterparty') or t.get('receiver') or 'Unknown'
-        merchants[cp] = merchants.get(cp, 0) + 1
-    top_merchants = sorted(merchants.items(), key=lambda x: x[1], reverse=True)[:5]
+        ttype = t.get('transaction_type')
+        if ttype == 'credit':
+            total_credit += amt
+        elif ttype == 'debit':
+            total_debit += amt
+            categories[t.get('category', 'other')] += amt
+        methods[t.get('payment_method', 'other')] += 1
+        merchants[t.get('counterparty') or t.get('receiver') or 'Unknown'] += 1
+    categories = sorted(categories.items(), key=itemgetter(1), reverse=True)
     
     context = f"""
 USER FINANCIAL SUMMARY (last {len(transactions)} transactions):
@@ -721,13 +1073,13 @@ USER FINANCIAL SUMMARY (last {len(transactions)} transactions):
 - Net Flow: ₹{total_credit - total_debit:,.2f}
 
 SPENDING BY CATEGORY:
-{chr(10).join(f'  - {cat}: ₹{amt:,.2f}' for cat, amt in sorted(categories.items(), key=lambda x: x[1], reverse=True))}
+{chr(10).join(f'  - {cat}: ₹{amt:,.2f}' for cat, amt in categories)}
 
 PAYMENT METHODS:
-{chr(10).join(f'  - {m}: {c} transactions' for m, c in sorted(methods.items(), key=lambda x: x[1], reverse=True)[:5])}
+{chr(10).join(f'  - {m}: {c} transactions' for m, c in methods.most_common(5))}
 
 TOP MERCHANTS:
-{chr(10).join(f'  - {m}: {c} transactions' for m, c in top_merchants)}
+{chr(10).join(f'  - {m}: {c} transactions' for m, c in merchants.most_common(5))}
 """
     return context
 
@@ -742,6 +1094,7 @@ async def ai_chat(request: PromptRequest):
       event: token   → LLM response chunk
       event: done    → stream complete
     """
+    llm = await asyncio.to_thread(get_llm)  # First call may pull the model
     if not llm:
         raise HTTPException(status_code=503, detail="LLM not available")
     
@@ -757,13 +1110,20 @@ async def ai_chat(request: PromptRequest):
             search_queries = should_crawl_web(user_query, llm_model=None)
             
             if search_queries:
-                yield f"event: status\ndata: {json.dumps({'phase': 'searching', 'message': 'Searching the web...'})}\n\n"
+                yield f"event: status\ndata: {orjson.dumps({'phase': 'searching', 'message': 'Searching the web...'}).decode()}\n\n"
+                
+                # Crawls are independent network I/O, so run them side by side
+                # and report progress as each one finishes
+                queries = search_queries[:3]
+                crawls = [asyncio.create_task(asyncio.to_thread(web_crawler.search_and_extract, q)) for q in queries]
+                yield f"event: status\ndata: {orjson.dumps({'phase': 'crawling', 'message': f'Crawling {len(queries)} queries in parallel', 'progress': 0, 'total': len(queries)}).decode()}\n\n"
+                for i, crawl in enumerate(asyncio.as_completed(crawls)):
+                    await crawl
+                    yield f"event: status\ndata: {orjson.dumps({'phase': 'crawling', 'message': f'Crawled {i+1} of {len(queries)}', 'progress': i+1, 'total': len(queries)}).decode()}\n\n"
                 
-                for i, query in enumerate(search_queries[:3]):
-                    yield f"event: status\ndata: {json.dumps({'phase': 'crawling', 'message': f'Crawling: {query}', 'progress': i+1, 'total': min(len(search_queries), 3)})}\n\n"
-                    
-                    results = web_crawler.search_and_extract(query)
-                    web_results.extend(results)
+                # Keep results in query order regardless of which finished first
+                for crawl in crawls:
+                    web_results.extend(crawl.result())
                 
                 # Send sources metadata
                 if web_results:
@@ -771,9 +1131,9 @@ async def ai_chat(request: PromptRequest):
                         {"title": r['title'], "url": r['url'], "extracted": r.get('extracted', False)}
                         for r in web_results[:5]
                     ]
-                    yield f"event: sources\ndata: {json.dumps(sources_meta)}\n\n"
+                    yield f"event: sources\ndata: {orjson.dumps(sources_meta).decode()}\n\n"
                 
-                yield f"event: status\ndata: {json.dumps({'phase': 'analyzing', 'message': 'Analyzing results...'})}\n\n"
+                yield f"event: status\ndata: {orjson.dumps({'phase': 'analyzing', 'message': 'Analyzing results...'}).decode()}\n\n"
         
         # Step 2: Build context
         financial_context = _build_financial_context(user_id)
@@ -796,19 +1156,21 @@ async def ai_chat(request: PromptRequest):
         )
         
         # Step 3: Stream LLM response
-        yield f"event: status\ndata: {json.dumps({'phase': 'generating', 'message': 'Generating response...'})}\n\n"
+        yield f"event: status\ndata: {orjson.dumps({'phase': 'generating', 'message': 'Generating response...'}).decode()}\n\n"
         
         full_response = ""
-        for chunk in llm.stream_response(user_query, system_prompt):
+        async for chunk in llm.astream_response(user_query, system_prompt):
             full_response += chunk
-            yield f"event: token\ndata: {json.dumps({'text': chunk})}\n\n"
+            yield f"event: token\ndata: {orjson.dumps({'text': chunk}).decode()}\n\n"
         
-        # Step 4: Store chat history
+        # Step 4: Store chat history in the background so "done" isn't held
+        # back by two Supabase round-trips
         if HAS_SUPABASE and user_id:
-            supa.store_chat_message(user_id, "user", user_query)
-            supa.store_chat_message(user_id, "assistant", full_response)
+            task = asyncio.create_task(asyncio.to_thread(_store_chat_turn, user_id, user_query, full_response))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
         
-        yield f"event: done\ndata: {json.dumps({'total_length': len(full_response)})}\n\n"
+        yield f"event: done\ndata: {orjson.dumps({'total_length': len(full_response)}).decode()}\n\n"
     
     return StreamingResponse(generate_sse(), media_type="text/event-stream")
 
@@ -829,11 +1191,12 @@ async def ai_chat_history(user_id: str):
 
 @app.post("/ask/stream")
 async def ask_llm_stream(request: PromptRequest):
+    llm = await asyncio.to_thread(get_llm)  # First call may pull the model
     if not llm:
         raise HTTPException(status_code=503, detail="LLM not available")
     try:
         return StreamingResponse(
-            llm.stream_response(request.prompt, request.system_prompt),
+            llm.astream_response(request.prompt, request.system_prompt),
             media_type="text/plain"
         )
     except Exception as e:
@@ -842,4 +1205,9 @@ async def ask_llm_stream(request: PromptRequest):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    # loop/http "auto" pick uvloop and httptools when installed (see
+    # requirements.txt), falling back to asyncio and h11.
+    # One worker only: raw-SMS dedup, _store_lock, the startup migrations
+    # and the auto-trainer are per process, so workers would race on the
+    # JSONL files.
+    uvicorn.run(app, host="0.0.0.0", port=8080, loop="auto", http="auto")
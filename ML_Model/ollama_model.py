@@ -1,9 +1,15 @@
+import asyncio
 import ollama
-from typing import Generator, Optional
+from typing import AsyncGenerator, Generator, Optional
+
+# Chunks the producer may read ahead of a slow client
+STREAM_BUFFER = 32
+
 
 class OllamaModel:
     def __init__(self, model_name: str = "vicuna:13b"):
         self.model_name = model_name
+        self.async_client = ollama.AsyncClient()
         try:
             ollama.show(self.model_name)
             print(f"Model '{self.model_name}' is ready.")
@@ -11,16 +17,55 @@ class OllamaModel:
             print(f"Model '{self.model_name}' not found. Pulling...")
             ollama.pull(self.model_name)
 
-    def stream_response(self, prompt: str, system_prompt: Optional[str] = None) -> Generator[str, None, None]:
+    @staticmethod
+    def _messages(prompt: str, system_prompt: Optional[str] = None) -> list:
         messages = []
         if system_prompt:
             messages.append({'role': 'system', 'content': system_prompt})
         messages.append({'role': 'user', 'content': prompt})
+        return messages
+
+    def stream_response(self, prompt: str, system_prompt: Optional[str] = None) -> Generator[str, None, None]:
         response_stream = ollama.chat(
             model=self.model_name,
-            messages=messages,
+            messages=self._messages(prompt, system_prompt),
             stream=True,
         )
 
         for chunk in response_stream:
-            yield chunk['message']['content']
\ No newline at end of file
+            yield chunk['message']['content']
+
+    async def astream_response(self, prompt: str, system_prompt: Optional[str] = None) -> AsyncGenerator[str, None]:
+        """
+        Async version of stream_response for the event loop. A producer task
+        keeps reading chunks from Ollama into a bounded queue while the
+        caller is still sending earlier ones, so generation and network
+        send overlap instead of taking turns.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_BUFFER)
+        done = object()
+
+        async def produce():
+            try:
+                response_stream = await self.async_client.chat(
+                    model=self.model_name,
+                    messages=self._messages(prompt, system_prompt),
+                    stream=True,
+                )
+                async for chunk in response_stream:
+                    await queue.put(chunk['message']['content'])
+                await queue.put(done)
+            except Exception as e:
+                await queue.put(e)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            producer.cancel()  # Client went away (or finished): stop reading from Ollama
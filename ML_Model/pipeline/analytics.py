@@ -5,16 +5,18 @@ Computes weekly, monthly, quarterly, and yearly analytics
 from processed transaction data.
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from collections import defaultdict
+import heapq
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+PERIODS = ('weekly', 'monthly', 'quarterly', 'yearly')
 
 
 def _ts_to_datetime(ts_str: str) -> Optional[datetime]:
     """Convert millisecond timestamp string to datetime."""
     try:
         return datetime.fromtimestamp(int(ts_str) / 1000)
-    except (ValueError, TypeError, OSError):
+    except (ValueError, TypeError, OSError, OverflowError):
         return None
 
 
@@ -29,53 +31,179 @@ def compute_analytics(transactions: List[dict], period: str = 'monthly') -> Dict
     Returns:
         dict with: summary, period_breakdown, category_breakdown, top_merchants
     """
-    if not transactions:
+    return compute_analytics_periods(transactions, [period])[period]
+
+
+def compute_analytics_periods(transactions: List[dict], periods: Iterable[str] = PERIODS) -> Dict[str, Dict]:
+    """
+    compute_analytics for several periods at once. Everything except the
+    period breakdown is period-independent, so the transactions are walked
+    once and the non-period sections are shared between the returned
+    results. The period breakdowns are built from per-day totals gathered
+    in the same walk, so each period only regroups the days.
+    """
+    return AnalyticsRollup.from_transactions(transactions).analytics(periods)
+
+
+class AnalyticsRollup:
+    """
+    Running totals behind compute_analytics: summary sums, payment method,
+    bank and merchant tallies, and per-day credit/debit totals. Adding
+    transactions is O(batch), and analytics() reads only the tallies, so a
+    caller that keeps a rollup up to date with its store never re-walks
+    the history. Totals accumulate in the order transactions are added,
+    so the result matches compute_analytics over the same list exactly.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.total_credit = self.total_debit = 0
+        self.credit_count = self.debit_count = 0
+        self.largest_credit = self.largest_debit = None
+        self.methods = {}    # method -> [count, amount]
+        self.banks = {}      # bank -> [count, credit, debit]
+        self.merchants = {}  # counterparty -> [count, total] (debits only)
+        self.days = {}       # date ordinal -> [datetime, credit, debit, credit_count, debit_count]
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[dict]) -> 'AnalyticsRollup':
+        rollup = cls()
+        rollup.extend(transactions)
+        return rollup
+
+    def add(self, txn: dict):
+        """Fold one more transaction into the totals."""
+        self.extend((txn,))
+
+    def extend(self, transactions: Iterable[dict]):
+        """Fold transactions into the totals (one pass, locals for speed)."""
+        total_credit, total_debit = self.total_credit, self.total_debit
+        credit_count, debit_count = self.credit_count, self.debit_count
+        largest_credit, largest_debit = self.largest_credit, self.largest_debit
+        methods, banks, merchants, days = self.methods, self.banks, self.merchants, self.days
+        size = self.size
+        
+        for txn in transactions:
+            size += 1
+            amount = txn.get('amount', 0) or 0
+            txn_type = txn.get('transaction_type')
+            is_credit = txn_type == 'credit'
+            
+            method = txn.get('payment_method', 'Unknown') or 'Unknown'
+            m = methods.get(method)
+            if m is None:
+                m = methods[method] = [0, 0]
+            m[0] += 1
+            m[1] += amount
+            
+            bank = txn.get('bank_name', 'Unknown') or 'Unknown'
+            b = banks.get(bank)
+            if b is None:
+                b = banks[bank] = [0, 0, 0]
+            b[0] += 1
+            b[1 if is_credit else 2] += amount
+            
+            if not is_credit and txn_type != 'debit':
+                continue
+            
+            dt = _ts_to_datetime(txn.get('timestamp', ''))
+            if dt:
+                d = days.get(dt.toordinal())
+                if d is None:
+                    d = days[dt.toordinal()] = [dt, 0, 0, 0, 0]
+                if is_credit:
+                    d[1] += amount
+                    d[3] += 1
+                else:
+                    d[2] += amount
+                    d[4] += 1
+            
+            # Summary and merchants only count transactions with an amount
+            if not amount:
+                continue
+            if is_credit:
+                total_credit += amount
+                credit_count += 1
+                if largest_credit is None or amount > largest_credit:
+                    largest_credit = amount
+            else:
+                total_debit += amount
+                debit_count += 1
+                if largest_debit is None or amount > largest_debit:
+                    largest_debit = amount
+                merchant = txn.get('counterparty', 'Unknown') or 'Unknown'
+                mc = merchants.get(merchant)
+                if mc is None:
+                    mc = merchants[merchant] = [0, 0]
+                mc[0] += 1
+                mc[1] += amount
+        
+        self.size = size
+        self.total_credit, self.total_debit = total_credit, total_debit
+        self.credit_count, self.debit_count = credit_count, debit_count
+        self.largest_credit, self.largest_debit = largest_credit, largest_debit
+
+    def analytics(self, periods: Iterable[str] = PERIODS) -> Dict[str, Dict]:
+        """compute_analytics_periods() output for everything added so far."""
+        periods = list(periods)
+        if not self.size:
+            return {
+                p: {
+                    'summary': _empty_summary(),
+                    'period_breakdown': [],
+                    'category_breakdown': {},
+                    'top_merchants': [],
+                }
+                for p in periods
+            }
+        
+        total_credit, total_debit = self.total_credit, self.total_debit
+        credit_count, debit_count = self.credit_count, self.debit_count
+        summary = {
+            'total_transactions': self.size,
+            'total_credits': credit_count,
+            'total_debits': debit_count,
+            'total_credit_amount': round(total_credit, 2),
+            'total_debit_amount': round(total_debit, 2),
+            'net_flow': round(total_credit - total_debit, 2),
+            'avg_credit': round(total_credit / credit_count, 2) if credit_count else 0,
+            'avg_debit': round(total_debit / debit_count, 2) if debit_count else 0,
+            'largest_credit': round(self.largest_credit if self.largest_credit is not None else 0, 2),
+            'largest_debit': round(self.largest_debit if self.largest_debit is not None else 0, 2),
+        }
+        
+        # Payment method breakdown
+        method_breakdown = {
+            k: {'count': v[0], 'amount': round(v[1], 2)}
+            for k, v in sorted(self.methods.items(), key=lambda x: x[1][1], reverse=True)
+        }
+        
+        # Bank breakdown
+        bank_breakdown = {
+            k: {
+                'count': v[0],
+                'credit': round(v[1], 2),
+                'debit': round(v[2], 2),
+            }
+            for k, v in sorted(self.banks.items(), key=lambda x: x[1][0], reverse=True)
+        }
+        
+        # Top merchants/counterparties (top-k selection; no need to sort them all)
+        top_merchants = [
+            {'name': name, 'count': v[0], 'total_amount': round(v[1], 2)}
+            for name, v in heapq.nlargest(10, self.merchants.items(), key=lambda x: x[1][1])
+        ]
+        
         return {
-            'summary': _empty_summary(),
-            'period_breakdown': [],
-            'category_breakdown': {},
-            'top_merchants': [],
+            p: {
+                'summary': summary,
+                'period_breakdown': _compute_period_breakdown(self.days.values(), p),
+                'payment_methods': method_breakdown,
+                'bank_breakdown': bank_breakdown,
+                'top_merchants': top_merchants,
+            }
+            for p in periods
         }
-    
-    # Separate credits and debits
-    credits = [t for t in transactions if t.get('transaction_type') == 'credit' and t.get('amount')]
-    debits = [t for t in transactions if t.get('transaction_type') == 'debit' and t.get('amount')]
-    
-    total_credit = sum(t['amount'] for t in credits)
-    total_debit = sum(t['amount'] for t in debits)
-    
-    summary = {
-        'total_transactions': len(transactions),
-        'total_credits': len(credits),
-        'total_debits': len(debits),
-        'total_credit_amount': round(total_credit, 2),
-        'total_debit_amount': round(total_debit, 2),
-        'net_flow': round(total_credit - total_debit, 2),
-        'avg_credit': round(total_credit / len(credits), 2) if credits else 0,
-        'avg_debit': round(total_debit / len(debits), 2) if debits else 0,
-        'largest_credit': round(max((t['amount'] for t in credits), default=0), 2),
-        'largest_debit': round(max((t['amount'] for t in debits), default=0), 2),
-    }
-    
-    # Period breakdown
-    period_breakdown = _compute_period_breakdown(transactions, period)
-    
-    # Payment method breakdown
-    method_breakdown = _compute_method_breakdown(transactions)
-    
-    # Bank breakdown
-    bank_breakdown = _compute_bank_breakdown(transactions)
-    
-    # Top merchants/counterparties
-    top_merchants = _compute_top_merchants(debits, limit=10)
-    
-    return {
-        'summary': summary,
-        'period_breakdown': period_breakdown,
-        'payment_methods': method_breakdown,
-        'bank_breakdown': bank_breakdown,
-        'top_merchants': top_merchants,
-    }
 
 
 def _empty_summary() -> Dict:
@@ -97,109 +225,42 @@ def _get_period_key(dt: datetime, period: str) -> str:
     """Get the period key for grouping."""
     if period == 'weekly':
         # ISO week
-        iso = dt.isocalendar()
-        return f"{iso[0]}-W{iso[1]:02d}"
+        year, week, _ = dt.isocalendar()
+        return f"{year}-W{week:02d}"
     elif period == 'monthly':
-        return dt.strftime('%Y-%m')
+        return f"{dt.year}-{dt.month:02d}"
     elif period == 'quarterly':
-        quarter = (dt.month - 1) // 3 + 1
-        return f"{dt.year}-Q{quarter}"
+        return f"{dt.year}-Q{(dt.month - 1) // 3 + 1}"
     elif period == 'yearly':
         return str(dt.year)
-    return dt.strftime('%Y-%m')
+    return f"{dt.year}-{dt.month:02d}"
 
 
-def _compute_period_breakdown(transactions: List[dict], period: str) -> List[dict]:
-    """Group transactions by time period."""
-    groups = defaultdict(lambda: {'credit': 0, 'debit': 0, 'credit_count': 0, 'debit_count': 0})
+def _compute_period_breakdown(days: Iterable[list], period: str) -> List[dict]:
+    """Group per-day [datetime, credit, debit, credit_count, debit_count] totals by time period."""
+    groups = {}  # key -> [credit, debit, credit_count, debit_count]
     
-    for txn in transactions:
-        dt = _ts_to_datetime(txn.get('timestamp', ''))
-        if not dt:
-            continue
-        
+    for dt, credit, debit, credit_count, debit_count in days:
         key = _get_period_key(dt, period)
-        amount = txn.get('amount', 0) or 0
-        txn_type = txn.get('transaction_type', '')
-        
-        if txn_type == 'credit':
-            groups[key]['credit'] += amount
-            groups[key]['credit_count'] += 1
-        elif txn_type == 'debit':
-            groups[key]['debit'] += amount
-            groups[key]['debit_count'] += 1
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = [0, 0, 0, 0]
+        g[0] += credit
+        g[1] += debit
+        g[2] += credit_count
+        g[3] += debit_count
     
     result = []
     for key in sorted(groups.keys()):
-        g = groups[key]
+        credit, debit, credit_count, debit_count = groups[key]
         result.append({
             'period': key,
-            'credit_amount': round(g['credit'], 2),
-            'debit_amount': round(g['debit'], 2),
-            'net_flow': round(g['credit'] - g['debit'], 2),
-            'credit_count': g['credit_count'],
-            'debit_count': g['debit_count'],
-            'total_count': g['credit_count'] + g['debit_count'],
+            'credit_amount': round(credit, 2),
+            'debit_amount': round(debit, 2),
+            'net_flow': round(credit - debit, 2),
+            'credit_count': credit_count,
+            'debit_count': debit_count,
+            'total_count': credit_count + debit_count,
         })
     
     return result
-
-
-def _compute_method_breakdown(transactions: List[dict]) -> Dict:
-    """Breakdown by payment method."""
-    methods = defaultdict(lambda: {'count': 0, 'amount': 0})
-    
-    for txn in transactions:
-        method = txn.get('payment_method', 'Unknown') or 'Unknown'
-        amount = txn.get('amount', 0) or 0
-        methods[method]['count'] += 1
-        methods[method]['amount'] += amount
-    
-    return {
-        k: {'count': v['count'], 'amount': round(v['amount'], 2)}
-        for k, v in sorted(methods.items(), key=lambda x: x[1]['amount'], reverse=True)
-    }
-
-
-def _compute_bank_breakdown(transactions: List[dict]) -> Dict:
-    """Breakdown by bank."""
-    banks = defaultdict(lambda: {'count': 0, 'credit': 0, 'debit': 0})
-    
-    for txn in transactions:
-        bank = txn.get('bank_name', 'Unknown') or 'Unknown'
-        amount = txn.get('amount', 0) or 0
-        banks[bank]['count'] += 1
-        
-        if txn.get('transaction_type') == 'credit':
-            banks[bank]['credit'] += amount
-        else:
-            banks[bank]['debit'] += amount
-    
-    return {
-        k: {
-            'count': v['count'],
-            'credit': round(v['credit'], 2),
-            'debit': round(v['debit'], 2),
-        }
-        for k, v in sorted(banks.items(), key=lambda x: x[1]['count'], reverse=True)
-    }
-
-
-def _compute_top_merchants(debits: List[dict], limit: int = 10) -> List[dict]:
-    """Top merchants/counterparties by spending."""
-    merchants = defaultdict(lambda: {'count': 0, 'total': 0})
-    
-    for txn in debits:
-        merchant = txn.get('counterparty', 'Unknown') or 'Unknown'
-        amount = txn.get('amount', 0) or 0
-        merchants[merchant]['count'] += 1
-        merchants[merchant]['total'] += amount
-    
-    sorted_merchants = sorted(
-        merchants.items(), key=lambda x: x[1]['total'], reverse=True
-    )[:limit]
-    
-    return [
-        {'name': name, 'count': data['count'], 'total_amount': round(data['total'], 2)}
-        for name, data in sorted_merchants
-    ]
@@ -1,7 +1,7 @@
 """
 classifier.py — SMS Classification Engine
 ==========================================
-Hybrid classifier: Rule-based labeling + ML ensemble for edge cases.
+Hybrid classifier: Rule-based labeling + ML model for edge cases.
 
 The rule-based labeler handles 90%+ of cases with high confidence.
 The ML model (TF-IDF + XGBoost) handles ambiguous cases where rule-based
@@ -14,19 +14,21 @@ improves as more users sync their SMS.
 
 import os
 import json
+from collections import OrderedDict
+from operator import itemgetter
 import joblib
 import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.ensemble import VotingClassifier, RandomForestClassifier
 from sklearn.model_selection import StratifiedKFold, cross_val_score
 from sklearn.metrics import (
     classification_report, confusion_matrix,
     accuracy_score, f1_score
 )
 
+from scipy.sparse import hstack
 from xgboost import XGBClassifier
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
 
 from pipeline.labeler import label_sms
 from pipeline.preprocessor import clean_text, extract_features
@@ -40,26 +42,39 @@ VECTORIZER_PATH = os.path.join(MODELS_DIR, 'tfidf_vectorizer.pkl')
 # Rule-based confidence threshold — below this, use ML model
 CONFIDENCE_THRESHOLD = 0.65
 
+# ML predictions remembered per (body, sender); bank templates repeat a lot
+ML_CACHE_SIZE = 4096
+
+# Hand-crafted feature columns, in extract_features() key order. train() and
+# prediction both stack them in this order, after the TF-IDF columns.
+_FEATURE_NAMES = tuple(extract_features(''))
+_hand_feature_row = itemgetter(*_FEATURE_NAMES)
+
 class SmsClassifier:
     """
     Hybrid SMS classifier for Indian SMS.
     
     Stage 1: Rule-based labeling (fast, deterministic, works on ANY SMS)
-    Stage 2: ML ensemble (for low-confidence cases, improves with data)
+    Stage 2: ML model (for low-confidence cases, improves with data)
     """
     
     def __init__(self):
         self.vectorizer: Optional[TfidfVectorizer] = None
         self.model = None
         self.is_trained = False
-        self._load_model()
+        self._ml_cache: OrderedDict = OrderedDict()  # (body, sender) -> (label, confidence)
+        self._load_attempted = False  # Model files are read on first classify, not here
     
     def _load_model(self):
         """Load pre-trained model if available."""
+        self._load_attempted = True
         if os.path.exists(CLASSIFIER_PATH) and os.path.exists(VECTORIZER_PATH):
             try:
-                self.model = joblib.load(CLASSIFIER_PATH)
-                self.vectorizer = joblib.load(VECTORIZER_PATH)
+                self._ml_cache.clear()
+                # mmap_mode: numpy arrays stay in the page cache, shared by
+                # every process that loads the same files
+                self.model = joblib.load(CLASSIFIER_PATH, mmap_mode='r')
+                self.vectorizer = joblib.load(VECTORIZER_PATH, mmap_mode='r')
                 self.is_trained = True
                 print("[Classifier] Loaded pre-trained model")
             except Exception as e:
@@ -72,56 +87,110 @@ class SmsClassifier:
         
         Returns dict with: label, sub_label, confidence, method
         """
-        # Stage 1: Rule-based
-        label, sub_label, confidence = label_sms(body, sender)
+        return self.classify_batch([body], [sender])[0]
+    
+    def classify_batch(self, bodies: List[str], senders: Optional[List[str]] = None) -> List[dict]:
+        """
+        Classify many SMS messages at once (same results as classify()).
         
-        result = {
-            'label': label,
-            'sub_label': sub_label,
-            'confidence': round(confidence, 3),
-            'method': 'rule_based'
-        }
+        Every SMS is rule-labeled first; the low-confidence ones then share
+        one TF-IDF transform and one model predict_proba call instead of
+        paying the sparse/model overhead once per message.
+        """
+        if senders is None:
+            senders = [""] * len(bodies)
+        if not self._load_attempted:
+            self._load_model()
+        
+        # Stage 1: Rule-based
+        results = []
+        rule_confidences = []
+        low_confidence = []
+        for i, (body, sender) in enumerate(zip(bodies, senders)):
+            label, sub_label, confidence = label_sms(body, sender)
+            results.append({
+                'label': label,
+                'sub_label': sub_label,
+                'confidence': round(confidence, 3),
+                'method': 'rule_based'
+            })
+            rule_confidences.append(confidence)
+            if confidence < CONFIDENCE_THRESHOLD:
+                low_confidence.append(i)
         
         # Stage 2: ML model for low-confidence cases
-        if confidence < CONFIDENCE_THRESHOLD and self.is_trained:
+        if low_confidence and self.is_trained:
             try:
-                ml_label, ml_confidence = self._ml_predict(body, sender)
-                if ml_confidence > confidence:
-                    result['label'] = ml_label
-                    result['confidence'] = round(ml_confidence, 3)
-                    result['method'] = 'ml_ensemble'
-                    # Keep sub_label from rule-based as ML only does broad labels
+                predictions = self._ml_predict_batch(
+                    [bodies[i] for i in low_confidence],
+                    [senders[i] for i in low_confidence],
+                )
+                for i, (ml_label, ml_confidence) in zip(low_confidence, predictions):
+                    if ml_confidence > rule_confidences[i]:
+                        results[i]['label'] = ml_label
+                        results[i]['confidence'] = round(ml_confidence, 3)
+                        results[i]['method'] = 'ml_ensemble'
+                        # Keep sub_label from rule-based as ML only does broad labels
             except Exception as e:
                 print(f"[Classifier] ML prediction error: {e}")
         
-        return result
+        return results
     
     def _ml_predict(self, body: str, sender: str) -> Tuple[str, float]:
         """Use ML model for prediction."""
-        clean = clean_text(body)
-        features_dict = extract_features(body, sender)
+        return self._ml_predict_batch([body], [sender])[0]
+    
+    def _ml_predict_batch(self, bodies: List[str], senders: List[str]) -> List[Tuple[str, float]]:
+        """
+        ML predictions for many SMS. Repeated (body, sender) pairs, within
+        the batch or seen recently, reuse their prediction; the rest share
+        one sparse matrix and one predict_proba call.
+        """
+        keys = list(zip(bodies, senders))
+        cache = self._ml_cache
+        predictions = {}
+        for key in keys:
+            if key in cache:
+                cache.move_to_end(key)
+                predictions[key] = cache[key]
+        missing = [key for key in dict.fromkeys(keys) if key not in predictions]
+        
+        if missing:
+            for key, prediction in zip(missing, self._ml_predict_uncached(missing)):
+                predictions[key] = cache[key] = prediction
+            while len(cache) > ML_CACHE_SIZE:
+                cache.popitem(last=False)
+        
+        return [predictions[key] for key in keys]
+    
+    def _ml_predict_uncached(self, keys: List[Tuple[str, str]]) -> List[Tuple[str, float]]:
+        """Featurize and predict (body, sender) pairs: one sparse matrix, one predict_proba."""
+        cleaned = [clean_text(body) for body, _ in keys]
+        features = [extract_features(body, sender, clean)
+                    for (body, sender), clean in zip(keys, cleaned)]
         
         # TF-IDF features
-        tfidf_features = self.vectorizer.transform([clean])
+        tfidf_features = self.vectorizer.transform(cleaned)
         
         # Hand-crafted features
-        feature_names = sorted(features_dict.keys())
-        hand_features = np.array([[features_dict[f] for f in feature_names]])
-        
-        # Combine features
-        from scipy.sparse import hstack
-        combined = hstack([tfidf_features, hand_features])
+        hand_features = np.array([_hand_feature_row(f) for f in features], dtype=np.float32)
         
-        # Predict
-        prediction = self.model.predict(combined)[0]
-        probabilities = self.model.predict_proba(combined)[0]
-        confidence = float(max(probabilities))
+        # Combine features straight into float32 CSR, the layout and precision
+        # XGBoost uses internally, so predict_proba doesn't convert again
+        combined = hstack([tfidf_features, hand_features], format='csr', dtype=np.float32)
         
-        return prediction, confidence
+        # Predict. The predicted class is the most probable one, so one
+        # predict_proba call gives both label and confidence; both come out
+        # of whole-matrix reductions, then one tolist() each
+        probabilities = self.model.predict_proba(combined)
+        best = probabilities.argmax(axis=1)
+        labels = self.model.classes_[best].tolist()
+        confidences = probabilities[np.arange(len(best)), best].tolist()
+        return list(zip(labels, confidences))
     
     def train(self, df: pd.DataFrame, save: bool = True) -> dict:
         """
-        Train the ML ensemble on labeled data.
+        Train the ML model (XGBoost) on labeled data.
         
         Args:
             df: DataFrame with 'body_clean', 'label', and feature columns
@@ -130,7 +199,7 @@ class SmsClassifier:
         Returns:
             dict with training metrics including XGBoost eval results
         """
-        print("[Classifier] Training ML ensemble...")
+        print("[Classifier] Training XGBoost model...")
         
         # Prepare text features with TF-IDF
         self.vectorizer = TfidfVectorizer(
@@ -144,13 +213,11 @@ class SmsClassifier:
         tfidf_matrix = self.vectorizer.fit_transform(df['body_clean'].fillna(''))
         
         # Hand-crafted features
-        feature_cols = [c for c in df.columns if c.startswith(('has_', 'is_')) 
-                       or c in ('body_length', 'word_count', 'financial_keyword_count')]
+        feature_cols = list(_FEATURE_NAMES)
         hand_features = df[feature_cols].values.astype(float)
         
-        # Combine
-        from scipy.sparse import hstack
-        X = hstack([tfidf_matrix, hand_features])
+        # Combine (float32 CSR: row-sliceable for the splits below)
+        X = hstack([tfidf_matrix, hand_features], format='csr', dtype=np.float32)
         y = df['label'].values
         
         # Encode labels
@@ -164,13 +231,15 @@ class SmsClassifier:
             X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
         )
         
-        # ── Train XGBoost standalone first to capture per-round loss ──
+        # ── Train on the split first: per-round loss, and early stopping
+        #    picks how many boosting rounds the final model gets ──
         xgb = XGBClassifier(
-            n_estimators=200,
+            tree_method='hist',
+            n_estimators=300,
             max_depth=6,
             learning_rate=0.1,
-            use_label_encoder=False,
             eval_metric='mlogloss',
+            early_stopping_rounds=20,
             random_state=42,
         )
         
@@ -187,28 +256,18 @@ class SmsClassifier:
         all_feature_names = tfidf_feature_names + feature_cols
         xgb_importance = xgb.feature_importances_
         
-        # ── Now train ensemble on full data ──
-        xgb_full = XGBClassifier(
-            n_estimators=200,
+        # ── Now train the final model on full data, with the early-stopped
+        #    round count (one histogram-based forest; no RF ensemble) ──
+        n_rounds = xgb.best_iteration + 1
+        self.model = XGBClassifier(
+            tree_method='hist',
+            n_estimators=n_rounds,
             max_depth=6,
             learning_rate=0.1,
-            use_label_encoder=False,
             eval_metric='mlogloss',
             random_state=42,
         )
         
-        rf = RandomForestClassifier(
-            n_estimators=200,
-            max_depth=10,
-            random_state=42,
-            n_jobs=-1,
-        )
-        
-        self.model = VotingClassifier(
-            estimators=[('xgb', xgb_full), ('rf', rf)],
-            voting='soft',
-        )
-        
         # Cross-validation
         cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
         cv_scores = cross_val_score(self.model, X, y_encoded, cv=cv, scoring='accuracy')
@@ -218,6 +277,8 @@ class SmsClassifier:
         # Train on full data
         self.model.fit(X, y_encoded)
         self.is_trained = True
+        self._load_attempted = True  # Don't let a later classify() swap in the old files
+        self._ml_cache.clear()
         
         # Store label encoder for inverse transform
         self._label_encoder = le
@@ -242,7 +303,7 @@ class SmsClassifier:
             # New: XGBoost training curves data
             'xgb_eval_results': xgb_eval_results,
             'xgb_learning_rate': 0.1,
-            'xgb_n_estimators': 200,
+            'xgb_n_estimators': len(xgb_eval_results['validation_1']['mlogloss']),
             # New: Feature importance
             'feature_names': all_feature_names,
             'feature_importance': xgb_importance.tolist(),
@@ -10,14 +10,31 @@ NOT trained on any specific dataset. Works dynamically on any Indian SMS.
 
 import re
 from datetime import datetime
-from typing import Dict, Optional
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from pipeline.pattern_scanner import PatternScanner, re2_source, COLUMNAR_MIN_BATCH
+
+# Optional: PyArrow runs the field regexes over a whole batch in RE2
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
 
 
 # ─── AMOUNT EXTRACTION ───────────────────────────────────────────────────
 # Handles: Rs.100, Rs 1,000.50, INR 500, Rs. 1,23,456.78 (Indian numbering)
+# The suffix form starts at the beginning of a digit run and takes it
+# possessively, like the labeler's AMOUNT_PATTERN: trying every position
+# inside a long bare number, each backing off digit by digit, is quadratic
+# in its length.
 AMOUNT_REGEX = re.compile(
     r'(?:Rs\.?|INR|₹)\s*([\d,]+(?:\.\d{1,2})?)'
-    r'|([\d,]+(?:\.\d{1,2})?)\s*(?:Rs\.?|INR|₹)',
+    r'|(?:^|[^\d,])([\d,]++(?:\.\d{1,2})?)\s*(?:Rs\.?|INR|₹)',
     re.IGNORECASE
 )
 
@@ -40,6 +57,8 @@ UPI_REF_REGEX = re.compile(
     r'|Ref\s*(?:No\.?|number|#)?)\s*[:\s]*(\d{6,})',
     re.IGNORECASE
 )
+# Generic reference: "Ref No XXXXX" or "Ref XXXXX"
+GENERIC_REF_REGEX = re.compile(r'Ref\.?\s*(?:No\.?\s*)?[:\s]*(\w{6,})', re.IGNORECASE)
 
 # ─── BANK NAME EXTRACTION ────────────────────────────────────────────────
 BANK_MAP = {
@@ -75,6 +94,17 @@ BANK_MAP = {
     'LICHFL': 'LIC Housing Finance',
     'CBOI': 'Central Bank of India',
 }
+# Sender headers look like "AX-SBIUPI-S": the bank's code starts the middle part
+_BANK_CODES = tuple(BANK_MAP)
+_BANK_CODE_LENGTHS = sorted({len(code) for code in BANK_MAP}, reverse=True)
+# Otherwise every code found in one scan; the earliest BANK_MAP entry among them wins
+_BANK_BY_PATTERN = {
+    re.compile(re.escape(code)): (rank, name)
+    for rank, (code, name) in enumerate(BANK_MAP.items())
+}
+_bank_scanner = PatternScanner(_BANK_BY_PATTERN, name='Extractor')
+# "- BANK_NAME" signature at the end of the SMS
+BANK_END_REGEX = re.compile(r'-\s*([A-Za-z\s]+?)$')
 
 # ─── COUNTERPARTY / MERCHANT EXTRACTION ──────────────────────────────────
 # Pattern: "to/from <NAME>" or "transfer from/to <NAME>"
@@ -96,6 +126,8 @@ DATE_REGEX_PATTERNS = [
     re.compile(r'(\d{1,2}\s*(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s*\d{2,4})', re.IGNORECASE),
     re.compile(r'((?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2},?\s*\d{2,4})', re.IGNORECASE),
 ]
+# Which date patterns occur, in one pass (a body without a date is scanned once)
+_date_scanner = PatternScanner(DATE_REGEX_PATTERNS, name='Extractor')
 
 # ─── BALANCE EXTRACTION ──────────────────────────────────────────────────
 BALANCE_REGEX = re.compile(
@@ -122,17 +154,25 @@ PAYMENT_METHODS = [
 ]
 
 
+def _to_amount(amt_str: Optional[str]) -> Optional[float]:
+    """'1,23,456.78' -> 123456.78 (None if empty or not a number)."""
+    if amt_str:
+        # The captured groups are digits, commas and a decimal point only,
+        # so there is no whitespace to strip
+        if ',' in amt_str:
+            amt_str = amt_str.replace(',', '')
+        try:
+            return float(amt_str)
+        except ValueError:
+            pass
+    return None
+
+
 def parse_amount(text: str) -> Optional[float]:
     """Extract the primary transaction amount from SMS text."""
     match = AMOUNT_REGEX.search(text)
     if match:
-        amt_str = match.group(1) or match.group(2)
-        if amt_str:
-            amt_str = amt_str.replace(',', '').strip()
-            try:
-                return float(amt_str)
-            except ValueError:
-                pass
+        return _to_amount(match.group(1) or match.group(2))
     return None
 
 
@@ -140,13 +180,9 @@ def parse_all_amounts(text: str) -> list:
     """Extract ALL amounts mentioned in the SMS."""
     amounts = []
     for match in AMOUNT_REGEX.finditer(text):
-        amt_str = match.group(1) or match.group(2)
-        if amt_str:
-            amt_str = amt_str.replace(',', '').strip()
-            try:
-                amounts.append(float(amt_str))
-            except ValueError:
-                pass
+        amount = _to_amount(match.group(1) or match.group(2))
+        if amount is not None:
+            amounts.append(amount)
     return amounts
 
 
@@ -161,24 +197,39 @@ def parse_account(text: str) -> Optional[str]:
     return None
 
 
+def _sender_bank(sender_upper: str) -> Optional[str]:
+    """Bank whose code starts the sender header (AX-HDFCBK-S -> HDFC Bank), longest code first."""
+    prefix, dash, rest = sender_upper.partition('-')
+    header = rest if dash and len(prefix) == 2 else prefix
+    if not header.startswith(_BANK_CODES):  # One C-level check rejects most senders
+        return None
+    for length in _BANK_CODE_LENGTHS:
+        name = BANK_MAP.get(header[:length])
+        if name:
+            return name
+    return None
+
+
 def parse_bank(sender: str, body: str) -> Optional[str]:
     """Identify the bank from sender code or body text."""
     sender_upper = sender.upper()
+    # The sender header is authoritative: the body may mention other banks
+    # (or words like "Union" in a merchant name)
+    bank = _sender_bank(sender_upper)
+    if bank:
+        return bank
     body_upper = body.upper()
     
-    for code, name in BANK_MAP.items():
-        if code in sender_upper or code in body_upper:
-            return name
-    
-    # Try to extract from body
-    bank_match = re.search(r'\b(SBI|HDFC|ICICI|AXIS|KOTAK|BOB|PNB|CENTBK|IPPB|IDBI)\b', 
-                            body_upper)
-    if bank_match:
-        code = bank_match.group(1)
-        return BANK_MAP.get(code, code)
+    matched = _bank_scanner.scan(f"{sender_upper}\n{body_upper}")
+    if matched is None:
+        for code, name in BANK_MAP.items():
+            if code in sender_upper or code in body_upper:
+                return name
+    elif matched:
+        return min(_BANK_BY_PATTERN[p] for p in matched)[1]
     
     # Check for "- BANK_NAME" at end of SMS (very common pattern)
-    end_match = re.search(r'-\s*([A-Za-z\s]+?)$', body.strip())
+    end_match = BANK_END_REGEX.search(body.strip())
     if end_match:
         bank_name = end_match.group(1).strip()
         if len(bank_name) > 2 and len(bank_name) < 40:
@@ -219,8 +270,7 @@ def parse_reference(body: str) -> Optional[str]:
     if match:
         return match.group(1)
     
-    # Generic reference: "Ref No XXXXX" or "Ref XXXXX"
-    ref_match = re.search(r'Ref\.?\s*(?:No\.?\s*)?[:\s]*(\w{6,})', body, re.IGNORECASE)
+    ref_match = GENERIC_REF_REGEX.search(body)
     if ref_match:
         return ref_match.group(1)
     return None
@@ -228,10 +278,12 @@ def parse_reference(body: str) -> Optional[str]:
 
 def parse_transaction_date(body: str, timestamp: str = "") -> Optional[str]:
     """Extract the transaction date from SMS body or timestamp."""
+    matched = _date_scanner.scan(body)  # None: try each pattern with re
     for pattern in DATE_REGEX_PATTERNS:
-        match = pattern.search(body)
-        if match:
-            return match.group(1)
+        if matched is None or pattern in matched:
+            match = pattern.search(body)
+            if match:
+                return match.group(1)
     
     # Fall back to SMS timestamp
     if timestamp:
@@ -249,154 +301,167 @@ def parse_balance(body: str) -> Optional[float]:
     """Extract balance after transaction."""
     match = BALANCE_REGEX.search(body)
     if match:
-        bal_str = match.group(1).replace(',', '').strip()
-        try:
-            return float(bal_str)
-        except ValueError:
-            pass
+        return _to_amount(match.group(1))
     return None
 
 
-def detect_transaction_type(body: str) -> Optional[str]:
-    """Determine if transaction is credit or debit."""
-    body_lower = body.lower()
-    
-    credit_kws = ['credited', 'received', 'deposited', 'refund', 'cashback', 'reversed', 'added']
-    debit_kws = ['debited', 'withdrawn', 'spent', 'paid', 'transferred', 'purchase', 'charged', 'deducted']
-    
-    has_credit = any(kw in body_lower for kw in credit_kws)
-    has_debit = any(kw in body_lower for kw in debit_kws)
+# ─── TRANSACTION TYPE ────────────────────────────────────────────────────
+CREDIT_KEYWORDS = ['credited', 'received', 'deposited', 'refund', 'cashback', 'reversed', 'added']
+DEBIT_KEYWORDS = ['debited', 'withdrawn', 'spent', 'paid', 'transferred', 'purchase', 'charged', 'deducted']
+# Credit first, so a credit keyword wins if both start at the same position
+TXN_TYPE_KEYWORDS = ([(kw, 'credit') for kw in CREDIT_KEYWORDS]
+                     + [(kw, 'debit') for kw in DEBIT_KEYWORDS])
+
+# Comprehensive exclusions for non-transactional SMS
+# (card statements, bill reminders, legal warnings, mandates, etc.)
+NON_TXN_PATTERNS = [re.compile(p) for p in [
+    r'(?:bill|amount|total|min|outstanding|amt)[.\s]*(?:due|payable)',
+    r'statement.*(?:generated|ready|available)',
+    r'legal\s*(?:action|notice)',
+    r'despite.*reminder',
+    r'several\s*reminders',
+    r'(?:pay|click).*quickpay',
+    r'please\s*(?:pay|clear|settle)',
+    r'further\s*delay',
+    r'mandate.*(?:revoked|failed|rejected)',
+    r'(?:txn|transaction).*(?:declined|failed)',
+    r'(?:declined|failed).*insufficient',
+    r'fund\s*bal|securities\s*bal',
+    r'reported.*(?:fund|securities)',
+    r'is\s+due\s+on',
+    r'payable\s*by',
+]]
+_non_txn_scanner = PatternScanner(NON_TXN_PATTERNS, name='Extractor')
+
+
+def detect_transaction_type(body: str, body_lower: str = None) -> Optional[str]:
+    """
+    Determine if transaction is credit or debit (first keyword in the body wins).
+    Pass body_lower when the caller already has it, to skip the case fold.
+    """
+    if body_lower is None:
+        body_lower = body.lower()
     
-    # Comprehensive exclusions for non-transactional SMS
-    # (card statements, bill reminders, legal warnings, mandates, etc.)
-    non_txn_patterns = [
-        r'(?:bill|amount|total|min|outstanding|amt)[.\s]*(?:due|payable)',
-        r'statement.*(?:generated|ready|available)',
-        r'legal\s*(?:action|notice)',
-        r'despite.*reminder',
-        r'several\s*reminders',
-        r'(?:pay|click).*quickpay',
-        r'please\s*(?:pay|clear|settle)',
-        r'further\s*delay',
-        r'mandate.*(?:revoked|failed|rejected)',
-        r'(?:txn|transaction).*(?:declined|failed)',
-        r'(?:declined|failed).*insufficient',
-        r'fund\s*bal|securities\s*bal',
-        r'reported.*(?:fund|securities)',
-        r'is\s+due\s+on',
-        r'payable\s*by',
-    ]
-    for pat in non_txn_patterns:
-        if re.search(pat, body_lower):
+    matched = _non_txn_scanner.scan(body_lower)  # One pass, when available
+    if matched is None:
+        if any(pat.search(body_lower) for pat in NON_TXN_PATTERNS):
             return None
+    elif matched:
+        return None
     
-    if has_credit and not has_debit:
-        return 'credit'
-    elif has_debit and not has_credit:
-        return 'debit'
-    elif has_credit and has_debit:
-        # First occurrence wins
-        for i, ch in enumerate(body_lower):
-            for kw in credit_kws:
-                if body_lower[i:].startswith(kw):
-                    return 'credit'
-            for kw in debit_kws:
-                if body_lower[i:].startswith(kw):
-                    return 'debit'
-    
-    return None
+    # Earliest keyword occurrence; str.find per keyword is a C-level scan,
+    # much cheaper than the old position-by-position tie-break
+    first_pos = len(body_lower)
+    txn_type = None
+    for kw, kw_type in TXN_TYPE_KEYWORDS:
+        pos = body_lower.find(kw)
+        if 0 <= pos < first_pos:
+            first_pos, txn_type = pos, kw_type
+    return txn_type
+
+
+# ─── CATEGORY DETECTION ──────────────────────────────────────────────────
+# Priority-ordered category rules
+CATEGORY_RULES = [
+    ('salary', [
+        r'\bsalary\b', r'\bpayroll\b', r'\bwage\b', r'\bstipend\b',
+        r'\bcompensation\b', r'\bneft.*(?:salary|payroll)\b',
+    ]),
+    ('emi', [
+        r'\bemi\b', r'\bloan\s*(?:repay|payment|installment)\b',
+        r'\binstallment\b', r'\bmortgage\b',
+    ]),
+    ('bills', [
+        r'\b(?:electric|electricity|gas|water|broadband|internet|wifi)\b',
+        r'\bbill\s*pay', r'\butility\b', r'\bjio\b.*(?:fiber|plan)',
+        r'\bairtel\b.*(?:fiber|plan|dth)', r'\btata\s*sky\b',
+        r'\bbses\b', r'\bbescom\b', r'\bmsedcl\b',
+        r'\btax\b', r'\bgst\b', r'\bincome\s*tax\b',
+        r'\bmunicipal\b', r'\bcouncil\b',
+    ]),
+    ('recharge', [
+        r'\brecharge\b', r'\bprepaid\b', r'\btalktime\b',
+        r'\bdata\s*pack\b', r'\bmobile.*plan\b',
+    ]),
+    ('food', [
+        r'\bswiggy\b', r'\bzomato\b', r'\bubereats\b', r'\bdominos\b',
+        r'\bpizza\b', r'\bmcdonalds\b', r'\bkfc\b', r'\bburger\b',
+        r'\brestaurant\b', r'\bcafe\b', r'\bfood\b', r'\bdining\b',
+        r'\bbigbasket\b', r'\bblinkit\b', r'\bzepto\b', r'\binstamart\b',
+        r'\bgrofers\b', r'\bgrocery\b', r'\bkirana\b',
+    ]),
+    ('shopping', [
+        r'\bamazon\b', r'\bflipkart\b', r'\bmyntra\b', r'\bajio\b',
+        r'\bmeesho\b', r'\bsnapdeal\b', r'\bnykaa\b', r'\bbigbazaar\b',
+        r'\breliance\b.*(?:retail|store|mart|digital)',
+        r'\bshopping\b', r'\bpurchase\b', r'\bstore\b', r'\bmall\b',
+        r'\bd.?mart\b', r'\bmore\s*retail\b', r'\btrend\b',
+    ]),
+    ('travel', [
+        r'\buber\b', r'\bola\b', r'\brapido\b', r'\blyft\b',
+        r'\birctc\b', r'\brailway\b', r'\btrain\b', r'\bflight\b',
+        r'\bmakemytrip\b', r'\bgoibibo\b', r'\bcleartrip\b',
+        r'\bhotel\b', r'\boyo\b', r'\bbooking\.com\b',
+        r'\bmetro\b', r'\bbus\b.*(?:ticket|pass|booking)',
+        r'\bfuel\b', r'\bpetrol\b', r'\bdiesel\b', r'\bhp\s*pay\b',
+        r'\bindian\s*oil\b', r'\bbharat\s*petroleum\b',
+        r'\bfastag\b', r'\btoll\b', r'\bparking\b',
+    ]),
+    ('entertainment', [
+        r'\bnetflix\b', r'\bhotstar\b', r'\bdisney\b', r'\bprime\b.*video',
+        r'\bspotify\b', r'\byoutube\b.*premium', r'\bgaana\b',
+        r'\bmovie\b', r'\bpvr\b', r'\binox\b', r'\bcinema\b',
+        r'\bgaming\b', r'\bsteam\b', r'\bplaystation\b',
+    ]),
+    ('health', [
+        r'\bhospital\b', r'\bclinic\b', r'\bmedic(?:al|ine)\b',
+        r'\bpharmac\b', r'\bdoctor\b', r'\blab\b.*(?:test|report)',
+        r'\b1mg\b', r'\bpharmeasy\b', r'\bnetmeds\b', r'\bpracto\b',
+        r'\bdiagnostic\b', r'\bhealth\b', r'\binsurance.*(?:health|medical)',
+    ]),
+    ('education', [
+        r'\bfee\b', r'\btuition\b', r'\bschool\b', r'\bcollege\b',
+        r'\buniversity\b', r'\bcourse\b', r'\budemy\b', r'\bcoursera\b',
+        r'\bunacademy\b', r'\bbyjus?\b', r'\beducation\b',
+        r'\bexam\b', r'\badmission\b',
+    ]),
+    ('investment', [
+        r'\bmutual\s*fund\b', r'\bsip\b', r'\bshare\b', r'\bstock\b',
+        r'\bzerodha\b', r'\bgroww\b', r'\bupstox\b', r'\bangel\b',
+        r'\bnse\b', r'\bbse\b', r'\bdemat\b', r'\btrading\b',
+        r'\bfd\b', r'\bfixed\s*deposit\b', r'\brd\b', r'\bppf\b',
+        r'\bnps\b', r'\bgold\b.*(?:invest|buy|bond)',
+    ]),
+    ('transfer', [
+        r'\btransfer\b', r'\bsent\s*to\b', r'\bpaid\s*to\b',
+        r'\breceived\s*from\b', r'\bp2p\b',
+    ]),
+]
+CATEGORY_REGEXES = [
+    (category, [re.compile(p, re.IGNORECASE) for p in patterns])
+    for category, patterns in CATEGORY_RULES
+]
+_category_scanner = PatternScanner(
+    [pat for _, patterns in CATEGORY_REGEXES for pat in patterns], name='Extractor'
+)
 
 
-def detect_category(body: str, counterparty: str = '', payment_method: str = '', txn_type: str = '') -> str:
+def detect_category(body: str, counterparty: str = '', payment_method: str = '', txn_type: str = '',
+                    body_lower: str = None) -> str:
     """
     Detect spending category from SMS body and metadata.
     Returns one of: shopping, food, travel, bills, salary, transfer,
     entertainment, health, education, investment, emi, recharge, other.
     """
-    body_lower = body.lower()
+    if body_lower is None:
+        body_lower = body.lower()
     cp_lower = (counterparty or '').lower()
     combined = f"{body_lower} {cp_lower}"
     
-    # Priority-ordered category rules
-    CATEGORY_RULES = [
-        ('salary', [
-            r'\bsalary\b', r'\bpayroll\b', r'\bwage\b', r'\bstipend\b',
-            r'\bcompensation\b', r'\bneft.*(?:salary|payroll)\b',
-        ]),
-        ('emi', [
-            r'\bemi\b', r'\bloan\s*(?:repay|payment|installment)\b',
-            r'\binstallment\b', r'\bmortgage\b',
-        ]),
-        ('bills', [
-            r'\b(?:electric|electricity|gas|water|broadband|internet|wifi)\b',
-            r'\bbill\s*pay', r'\butility\b', r'\bjio\b.*(?:fiber|plan)',
-            r'\bairtel\b.*(?:fiber|plan|dth)', r'\btata\s*sky\b',
-            r'\bbses\b', r'\bbescom\b', r'\bmsedcl\b',
-            r'\btax\b', r'\bgst\b', r'\bincome\s*tax\b',
-            r'\bmunicipal\b', r'\bcouncil\b',
-        ]),
-        ('recharge', [
-            r'\brecharge\b', r'\bprepaid\b', r'\btalktime\b',
-            r'\bdata\s*pack\b', r'\bmobile.*plan\b',
-        ]),
-        ('food', [
-            r'\bswiggy\b', r'\bzomato\b', r'\bubereats\b', r'\bdominos\b',
-            r'\bpizza\b', r'\bmcdonalds\b', r'\bkfc\b', r'\bburger\b',
-            r'\brestaurant\b', r'\bcafe\b', r'\bfood\b', r'\bdining\b',
-            r'\bbigbasket\b', r'\bblinkit\b', r'\bzepto\b', r'\binstamart\b',
-            r'\bgrofers\b', r'\bgrocery\b', r'\bkirana\b',
-        ]),
-        ('shopping', [
-            r'\bamazon\b', r'\bflipkart\b', r'\bmyntra\b', r'\bajio\b',
-            r'\bmeesho\b', r'\bsnapdeal\b', r'\bnykaa\b', r'\bbigbazaar\b',
-            r'\breliance\b.*(?:retail|store|mart|digital)',
-            r'\bshopping\b', r'\bpurchase\b', r'\bstore\b', r'\bmall\b',
-            r'\bd.?mart\b', r'\bmore\s*retail\b', r'\btrend\b',
-        ]),
-        ('travel', [
-            r'\buber\b', r'\bola\b', r'\brapido\b', r'\blyft\b',
-            r'\birctc\b', r'\brailway\b', r'\btrain\b', r'\bflight\b',
-            r'\bmakemytrip\b', r'\bgoibibo\b', r'\bcleartrip\b',
-            r'\bhotel\b', r'\boyo\b', r'\bbooking\.com\b',
-            r'\bmetro\b', r'\bbus\b.*(?:ticket|pass|booking)',
-            r'\bfuel\b', r'\bpetrol\b', r'\bdiesel\b', r'\bhp\s*pay\b',
-            r'\bindian\s*oil\b', r'\bbharat\s*petroleum\b',
-            r'\bfastag\b', r'\btoll\b', r'\bparking\b',
-        ]),
-        ('entertainment', [
-            r'\bnetflix\b', r'\bhotstar\b', r'\bdisney\b', r'\bprime\b.*video',
-            r'\bspotify\b', r'\byoutube\b.*premium', r'\bgaana\b',
-            r'\bmovie\b', r'\bpvr\b', r'\binox\b', r'\bcinema\b',
-            r'\bgaming\b', r'\bsteam\b', r'\bplaystation\b',
-        ]),
-        ('health', [
-            r'\bhospital\b', r'\bclinic\b', r'\bmedic(?:al|ine)\b',
-            r'\bpharmac\b', r'\bdoctor\b', r'\blab\b.*(?:test|report)',
-            r'\b1mg\b', r'\bpharmeasy\b', r'\bnetmeds\b', r'\bpracto\b',
-            r'\bdiagnostic\b', r'\bhealth\b', r'\binsurance.*(?:health|medical)',
-        ]),
-        ('education', [
-            r'\bfee\b', r'\btuition\b', r'\bschool\b', r'\bcollege\b',
-            r'\buniversity\b', r'\bcourse\b', r'\budemy\b', r'\bcoursera\b',
-            r'\bunacademy\b', r'\bbyjus?\b', r'\beducation\b',
-            r'\bexam\b', r'\badmission\b',
-        ]),
-        ('investment', [
-            r'\bmutual\s*fund\b', r'\bsip\b', r'\bshare\b', r'\bstock\b',
-            r'\bzerodha\b', r'\bgroww\b', r'\bupstox\b', r'\bangel\b',
-            r'\bnse\b', r'\bbse\b', r'\bdemat\b', r'\btrading\b',
-            r'\bfd\b', r'\bfixed\s*deposit\b', r'\brd\b', r'\bppf\b',
-            r'\bnps\b', r'\bgold\b.*(?:invest|buy|bond)',
-        ]),
-        ('transfer', [
-            r'\btransfer\b', r'\bsent\s*to\b', r'\bpaid\s*to\b',
-            r'\breceived\s*from\b', r'\bp2p\b',
-        ]),
-    ]
-    
-    for category, patterns in CATEGORY_RULES:
+    matched = _category_scanner.scan(combined)  # One pass, when available
+    for category, patterns in CATEGORY_REGEXES:
         for pat in patterns:
-            if re.search(pat, combined, re.IGNORECASE):
+            if (pat in matched) if matched is not None else pat.search(combined):
                 return category
     
     # Heuristic: salary-like credits
@@ -407,10 +472,13 @@ def detect_category(body: str, counterparty: str = '', payment_method: str = '',
     return 'other'
 
 
-def extract_transaction(sms: dict) -> Dict:
+def extract_transaction(sms: dict, scanned: Optional[dict] = None) -> Dict:
     """
     Extract ALL transaction details from a single SMS.
     
+    scanned holds fields already extracted for this SMS by a columnar
+    batch scan (see _scan_columns); they are not parsed again.
+    
     Returns a rich transaction dict with:
     - amount, transaction_type, account, bank, counterparty,
       payment_method, reference, transaction_date, balance_after,
@@ -419,20 +487,21 @@ def extract_transaction(sms: dict) -> Dict:
     body = sms.get('body', '')
     sender = sms.get('address', '')
     timestamp = sms.get('date', '')
+    body_lower = body.lower()  # Shared by the keyword-based detectors
     
-    amount = parse_amount(body)
+    amount = scanned['amount'] if scanned else parse_amount(body)
     all_amounts = parse_all_amounts(body)
-    txn_type = detect_transaction_type(body)
-    account = parse_account(body)
+    txn_type = detect_transaction_type(body, body_lower)
+    account = scanned['account'] if scanned else parse_account(body)
     bank = parse_bank(sender, body)
     counterparty = parse_counterparty(body)
-    payment_method = parse_payment_method(body)
+    payment_method = scanned['payment_method'] if scanned else parse_payment_method(body)
     reference = parse_reference(body)
     txn_date = parse_transaction_date(body, timestamp)
-    balance = parse_balance(body)
+    balance = scanned['balance'] if scanned else parse_balance(body)
     
     # Detect spending category
-    category = detect_category(body, counterparty or '', payment_method or '', txn_type or '')
+    category = detect_category(body, counterparty or '', payment_method or '', txn_type or '', body_lower)
     
     # Build description from available info
     desc_parts = []
@@ -469,6 +538,79 @@ def extract_transaction(sms: dict) -> Dict:
     }
 
 
-def extract_transactions_batch(sms_list: list) -> list:
-    """Extract transaction details from a batch of SMS."""
-    return [extract_transaction(sms) for sms in sms_list]
+# ─── COLUMNAR BATCH SCAN ─────────────────────────────────────────────────
+# SMS per scan: big enough to amortise the column, small enough that a long
+# stream only ever holds one chunk of scan results
+COLUMNAR_CHUNK = 1024
+
+
+def _first_groups(column, pattern: re.Pattern) -> list:
+    """Groups of each row's first match, as a tuple (None where no match)."""
+    matches = pc.extract_regex(column, re2_source(pattern, name_groups=True)).to_pylist()
+    return [tuple(m.values()) if m is not None else None for m in matches]
+
+
+def _scan_columns(bodies: List[str]) -> List[Optional[dict]]:
+    """
+    Amount, account, balance and payment method for a whole batch, with
+    each regex run once over an Arrow string column by RE2 instead of once
+    per SMS. Like PatternScanner, only ASCII bodies are scanned this way
+    (there RE2 and re agree); the rest get None and are parsed per row.
+    If RE2 rejects a pattern, every row gets None.
+    """
+    eligible = [isinstance(body, str) and body.isascii() for body in bodies]
+    column = pa.array([body if ok else '' for body, ok in zip(bodies, eligible)], pa.string())
+    
+    try:
+        amounts = _first_groups(column, AMOUNT_REGEX)
+        accounts = _first_groups(column, ACCOUNT_REGEX)
+        cards = _first_groups(column, CARD_REGEX)
+        balances = _first_groups(column, BALANCE_REGEX)
+        
+        # First PAYMENT_METHODS entry that matches each row
+        hits = np.vstack([
+            pc.match_substring_regex(column, re2_source(pattern, name_groups=True)).to_numpy(zero_copy_only=False)
+            for _, pattern in PAYMENT_METHODS
+        ])
+    except pa.ArrowInvalid:  # A pattern RE2 can't compile
+        return [None] * len(bodies)
+    first_hit = hits.argmax(axis=0).tolist()
+    any_hit = hits.any(axis=0).tolist()
+    
+    scanned = []
+    for i, ok in enumerate(eligible):
+        if not ok:
+            scanned.append(None)
+            continue
+        amount, account, card, balance = amounts[i], accounts[i], cards[i], balances[i]
+        if account is not None:
+            account = account[0].strip()
+        elif card is not None:
+            account = card[0].strip()
+        scanned.append({
+            'amount': _to_amount(amount[0] or amount[1]) if amount is not None else None,
+            'account': account,
+            'balance': _to_amount(balance[0]) if balance is not None else None,
+            'payment_method': PAYMENT_METHODS[first_hit[i]][0] if any_hit[i] else None,
+        })
+    return scanned
+
+
+def extract_transactions_batch(sms_iterable: Iterable[dict]) -> Iterator[Dict]:
+    """
+    Extract transaction details from a stream of SMS, yielded in order.
+    Input is consumed a chunk at a time, so neither the whole input nor
+    the whole output has to be held; wrap in list() to materialize.
+    """
+    sms_iter = iter(sms_iterable)
+    while True:
+        chunk = list(islice(sms_iter, COLUMNAR_CHUNK))
+        if not chunk:
+            return
+        if not HAS_PYARROW or len(chunk) < COLUMNAR_MIN_BATCH:
+            for sms in chunk:
+                yield extract_transaction(sms)
+            continue
+        scanned = _scan_columns([sms.get('body', '') for sms in chunk])
+        for sms, fields in zip(chunk, scanned):
+            yield extract_transaction(sms, fields)
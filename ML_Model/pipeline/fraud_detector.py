@@ -11,10 +11,15 @@ rule-based checks for known Indian spam patterns.
 """
 
 import re
+import bisect
+import math
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+from pipeline.labeler import is_phone_sender
+from pipeline.pattern_scanner import PatternScanner
+
 
 # ─── INDIAN SPAM / PHISHING PATTERNS ─────────────────────────────────────
 SPAM_PATTERNS = [
@@ -40,11 +45,28 @@ SPAM_PATTERNS = [
     re.compile(r'(?i)(?:call|contact)\s*(?:us|customer).*(?:otp|password)'),
 ]
 
-# Known legitimate Indian bank SMS sender patterns
-LEGITIMATE_BANK_PREFIXES = re.compile(
-    r'^[A-Z]{2}-[A-Z]+'
+# (spam_type, reason) for each of SPAM_PATTERNS, in the same order
+SPAM_META = (
+    [('lottery_scam', 'Contains lottery/prize scam language')] * 3
+    + [('fake_bank_alert', 'Contains fake bank alert / KYC scam language')] * 3
+    + [('loan_scam', 'Contains suspicious loan offer')] * 2
+    + [('phishing_url', 'Contains shortened/suspicious URL')]
+    + [('otp_theft', 'Attempting OTP theft')] * 2
 )
 
+# All spam patterns in one pass (Hyperscan, when available)
+_spam_scanner = PatternScanner(SPAM_PATTERNS, name='FraudDetector')
+_SPAM_BITS = {pattern: 1 << i for i, pattern in enumerate(SPAM_PATTERNS)}
+
+# Known legitimate Indian bank SMS sender patterns: "AD-HDFCBK...", i.e.
+# what r'^[A-Z]{2}-[A-Z]+' matches, checked without a regex call
+_ASCII_UPPER = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+
+def is_bank_header(sender: str) -> bool:
+    return (len(sender) >= 4 and sender[2] == '-' and sender[0] in _ASCII_UPPER
+            and sender[1] in _ASCII_UPPER and sender[3] in _ASCII_UPPER)
+
 # Suspicious URL patterns (not from known banks)
 KNOWN_BANK_DOMAINS = [
     'sbicard.com', 'onlinesbi.com', 'hdfcbank.com', 'icicibank.com',
@@ -53,6 +75,9 @@ KNOWN_BANK_DOMAINS = [
     'idbidirect.in', 'federalbank.co.in', 'yesbank.in', 'rblbank.com',
     'paytm.com', 'phonepe.com', 'airtel.in', 'jio.com',
 ]
+# Any known domain in a URL host, in one C-level scan
+KNOWN_BANK_DOMAIN_REGEX = re.compile('|'.join(map(re.escape, KNOWN_BANK_DOMAINS)))
+URL_HOST_REGEX = re.compile(r'https?://([^\s/]+)')
 
 
 def detect_spam(sms: dict) -> Dict:
@@ -64,44 +89,38 @@ def detect_spam(sms: dict) -> Dict:
     """
     body = sms.get('body', '')
     sender = sms.get('address', '')
+    body_lower = body.lower()
     
     reasons = []
     confidence = 0.0
     spam_type = None
     
-    # Check against spam patterns
-    for i, pattern in enumerate(SPAM_PATTERNS):
-        if pattern.search(body):
-            confidence += 0.30
-            if i < 3:
-                spam_type = 'lottery_scam'
-                reasons.append('Contains lottery/prize scam language')
-            elif i < 6:
-                spam_type = 'fake_bank_alert'
-                reasons.append('Contains fake bank alert / KYC scam language')
-            elif i < 8:
-                spam_type = 'loan_scam'
-                reasons.append('Contains suspicious loan offer')
-            elif i < 9:
-                spam_type = 'phishing_url'
-                reasons.append('Contains shortened/suspicious URL')
-            else:
-                spam_type = 'otp_theft'
-                reasons.append('Attempting OTP theft')
+    # Check against spam patterns: bit i of hits is SPAM_PATTERNS[i]
+    matched = _spam_scanner.scan(body)  # None: check each pattern with re
+    if matched is None:
+        hits = 0
+        for i, pattern in enumerate(SPAM_PATTERNS):
+            if pattern.search(body):
+                hits |= 1 << i
+    else:
+        hits = sum(_SPAM_BITS[pattern] for pattern in matched)
+    if hits:
+        # 0.30 and a reason per matched pattern; the last match names the type
+        confidence = 0.30 * hits.bit_count()
+        reasons = [SPAM_META[i][1] for i in range(hits.bit_length()) if hits >> i & 1]
+        spam_type = SPAM_META[hits.bit_length() - 1][0]
     
     # Check sender legitimacy
-    if not LEGITIMATE_BANK_PREFIXES.match(sender) and not re.match(r'^\+?\d{10,}$', sender):
+    if not is_bank_header(sender) and not is_phone_sender(sender):
         # Unusual sender format
-        if any(kw in body.lower() for kw in ['bank', 'account', 'card', 'upi']):
+        if any(kw in body_lower for kw in ['bank', 'account', 'card', 'upi']):
             confidence += 0.15
             reasons.append('Non-standard sender claiming financial content')
     
-    # Check URLs in body
-    urls = re.findall(r'https?://([^\s/]+)', body)
-    for url in urls:
-        url_lower = url.lower()
-        if not any(domain in url_lower for domain in KNOWN_BANK_DOMAINS):
-            if any(kw in body.lower() for kw in ['click', 'verify', 'update', 'kyc']):
+    # Check URLs in body (most SMS have none, so skip the regex without '://')
+    if '://' in body and any(kw in body_lower for kw in ['click', 'verify', 'update', 'kyc']):
+        for url in URL_HOST_REGEX.findall(body):
+            if not KNOWN_BANK_DOMAIN_REGEX.search(url.lower()):
                 confidence += 0.20
                 reasons.append(f'Unknown URL ({url}) with urgency language')
     
@@ -115,7 +134,109 @@ def detect_spam(sms: dict) -> Dict:
     }
 
 
-def detect_anomaly(transaction: dict, user_history: List[dict] = None) -> Dict:
+DAY_MS = 86400000  # 24h in ms
+
+
+class HistorySummary:
+    """
+    What detect_anomaly needs from a user's history, kept up to date one
+    transaction at a time: a running mean/variance of amounts (Welford),
+    sorted debit timestamps and the set of known counterparties. Adding a
+    transaction is O(log n) plus a list insert, so the baseline never has
+    to be rebuilt from the full history after each batch.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.amount_count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._debit_ts = []
+        self._debit_ts_valid = True
+        self.counterparties = set()
+
+    @classmethod
+    def from_history(cls, user_history: List[dict]) -> 'HistorySummary':
+        """
+        Build the summary column-wise: one pass pulls out the amounts, debit
+        timestamps and counterparties, then mean and variance are reduced
+        over a float64 array instead of one Welford step per transaction.
+        """
+        summary = cls()
+        summary.size = len(user_history)
+        amounts = [a for t in user_history if (a := t.get('amount', 0))]
+        if amounts:
+            values = np.array(amounts, dtype=np.float64)
+            summary.amount_count = len(amounts)
+            summary._mean = float(values.mean())
+            summary._m2 = float(values.var()) * len(amounts)
+        try:
+            summary._debit_ts = sorted(
+                int(t.get('timestamp', 0))
+                for t in user_history if t.get('transaction_type') == 'debit'
+            )
+        except (ValueError, TypeError, OverflowError):
+            # Any unparseable timestamp disables the frequency check (as it always did)
+            summary._debit_ts_valid = False
+        summary.counterparties = {t['counterparty'] for t in user_history if t.get('counterparty')}
+        return summary
+
+    def _add_stats(self, t: dict):
+        self.size += 1
+        amount = t.get('amount', 0)
+        if amount:
+            self.amount_count += 1
+            delta = amount - self._mean
+            self._mean += delta / self.amount_count
+            self._m2 += delta * (amount - self._mean)
+        if self._debit_ts_valid and t.get('transaction_type') == 'debit':
+            # Any unparseable timestamp disables the frequency check (as it always did)
+            try:
+                self._debit_ts.append(int(t.get('timestamp', 0)))
+            except (ValueError, TypeError, OverflowError):
+                self._debit_ts_valid = False
+                self._debit_ts = []
+        if t.get('counterparty'):
+            self.counterparties.add(t['counterparty'])
+
+    def add(self, t: dict):
+        """Fold one more stored transaction into the summary."""
+        n = len(self._debit_ts)
+        self._add_stats(t)
+        if len(self._debit_ts) > n:
+            ts = self._debit_ts.pop()
+            bisect.insort(self._debit_ts, ts)
+
+    @property
+    def mean_amount(self) -> Optional[float]:
+        return self._mean if self.amount_count >= 5 else None
+
+    @property
+    def std_amount(self) -> Optional[float]:
+        if self.amount_count < 5:
+            return None
+        return math.sqrt(self._m2 / self.amount_count) or 1.0
+
+    def recent_debits(self, timestamp: int) -> Optional[int]:
+        """Debits strictly within DAY_MS either side of timestamp (None if unknown)."""
+        if not self._debit_ts_valid:
+            return None
+        lo = bisect.bisect_right(self._debit_ts, timestamp - DAY_MS)
+        hi = bisect.bisect_left(self._debit_ts, timestamp + DAY_MS)
+        return hi - lo
+
+
+def summarize_history(user_history: List[dict]) -> HistorySummary:
+    """
+    Precompute what detect_anomaly needs from a user's history, so scoring a
+    batch of transactions costs one pass over the history instead of one
+    pass per transaction.
+    """
+    return HistorySummary.from_history(user_history)
+
+
+def detect_anomaly(transaction: dict, user_history: List[dict] = None,
+                   history_stats: HistorySummary = None) -> Dict:
     """
     Detect anomalous transactions based on user's history.
     
@@ -127,12 +248,17 @@ def detect_anomaly(transaction: dict, user_history: List[dict] = None) -> Dict:
     Args:
         transaction: Single transaction dict from extractor
         user_history: List of previous transactions for this user
+        history_stats: HistorySummary of the history, when scoring many
+            transactions against the same (or a running) history
         
     Returns:
         dict with: is_anomaly, anomaly_score, anomaly_reasons
     """
+    if history_stats is None and user_history:
+        history_stats = summarize_history(user_history)
+    
     amount = transaction.get('amount')
-    if not amount or not user_history:
+    if not amount or history_stats is None or not history_stats.size:
         return {
             'is_anomaly': False,
             'anomaly_score': 0.0,
@@ -143,10 +269,9 @@ def detect_anomaly(transaction: dict, user_history: List[dict] = None) -> Dict:
     score = 0.0
     
     # ── Amount anomaly (Z-score) ──
-    historical_amounts = [t.get('amount', 0) for t in user_history if t.get('amount')]
-    if len(historical_amounts) >= 5:
-        mean_amount = np.mean(historical_amounts)
-        std_amount = np.std(historical_amounts) or 1.0
+    mean_amount = history_stats.mean_amount
+    if mean_amount is not None:
+        std_amount = history_stats.std_amount
         z_score = abs((amount - mean_amount) / std_amount)
         
         if z_score > 3.0:
@@ -158,27 +283,20 @@ def detect_anomaly(transaction: dict, user_history: List[dict] = None) -> Dict:
     
     # ── Frequency anomaly ──
     txn_type = transaction.get('transaction_type')
-    if txn_type == 'debit' and len(user_history) >= 3:
-        # Count debits in last 24 hours
+    if txn_type == 'debit' and history_stats.size >= 3:
+        # Count debits in last 24 hours (strictly within DAY_MS either side)
         try:
-            current_ts = int(transaction.get('timestamp', 0))
-            recent_debits = sum(
-                1 for t in user_history
-                if t.get('transaction_type') == 'debit'
-                and abs(int(t.get('timestamp', 0)) - current_ts) < 86400000  # 24h in ms
-            )
-            if recent_debits > 5:
+            recent_debits = history_stats.recent_debits(int(transaction.get('timestamp', 0)))
+            if recent_debits is not None and recent_debits > 5:
                 score += 0.30
                 reasons.append(f'{recent_debits} debits in 24 hours is unusual')
-        except (ValueError, TypeError):
+        except (ValueError, TypeError, OverflowError):
             pass
     
     # ── New counterparty ──
     counterparty = transaction.get('counterparty', '')
     if counterparty:
-        known_counterparties = set(
-            t.get('counterparty', '') for t in user_history if t.get('counterparty')
-        )
+        known_counterparties = history_stats.counterparties
         if counterparty not in known_counterparties and len(known_counterparties) > 3:
             score += 0.10
             reasons.append(f'New counterparty: {counterparty}')
@@ -223,3 +341,8 @@ def analyze_sms(sms: dict, user_history: List[dict] = None) -> Dict:
         'fraud_confidence': 0.0,
         'reasons': [],
     }
+
+
+def analyze_batch(sms_list: List[dict], user_history: List[dict] = None) -> List[Dict]:
+    """analyze_sms() over a batch of SMS, in input order."""
+    return [analyze_sms(sms, user_history) for sms in sms_list]
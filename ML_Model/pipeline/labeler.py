@@ -14,28 +14,37 @@ Labels:
 """
 
 import re
-from typing import Dict, Tuple
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from pipeline.pattern_scanner import PatternScanner, build_automaton
 
 # ─── UNIVERSAL INDIAN FINANCIAL PATTERNS ──────────────────────────────────
 # These cover ALL Indian banks, not just specific ones.
 
 # Comprehensive list of Indian bank sender code patterns
+BANK_SENDER_CODES = (
+    'SBI', 'HDFC', 'ICICI', 'AXIS', 'KOTAK', 'BOB', 'PNB', 'UNION', 'CANARA', 'CENTBK', 'IPPB',
+    'IDBI', 'INDBNK', 'FEDERAL', 'BARODA', 'SYNDCT', 'ANDHRA', 'ALLAHABAD', 'UCO', 'IOB',
+    'MAHABK', 'DENABNK', 'VIJAYA', 'CORPBNK', 'INDUSIND', 'YESBNK', 'BANDHAN', 'RBL',
+    'CITI', 'HSBC', 'STANCHART', 'AMEX', 'PAYTM', 'PHONEPE', 'GPAY', 'AMAZONPAY',
+    'BAJFIN', 'TATACAP', 'MUTHOOT', 'MANAPPURAM', 'LICHFL',
+    'SBIUPI', 'HDFCUPI', 'ICICUPI', 'AXISUPI', 'BOBUPI', 'PNBUPI',
+    'SBICRD', 'HDFCCC', 'ICICICC', 'AXISCC', 'KOTAKCC',
+    'SBIBNK', 'HDFCBN', 'ICICBN', 'AXISBN',
+)
 BANK_SENDER_PATTERNS = re.compile(
-    r'(?i)(SBI|HDFC|ICICI|AXIS|KOTAK|BOB|PNB|UNION|CANARA|CENTBK|IPPB|'
-    r'IDBI|INDBNK|FEDERAL|BARODA|SYNDCT|ANDHRA|ALLAHABAD|UCO|IOB|'
-    r'MAHABK|DENABNK|VIJAYA|CORPBNK|INDUSIND|YESBNK|BANDHAN|RBL|'
-    r'CITI|HSBC|STANCHART|AMEX|PAYTM|PHONEPE|GPAY|AMAZONPAY|'
-    r'BAJFIN|TATACAP|MUTHOOT|MANAPPURAM|LICHFL|'
-    r'SBIUPI|HDFCUPI|ICICUPI|AXISUPI|BOBUPI|PNBUPI|'
-    r'SBICRD|HDFCCC|ICICICC|AXISCC|KOTAKCC|'
-    r'SBIBNK|HDFCBN|ICICBN|AXISBN)',
+    r'(?i)(' + '|'.join(BANK_SENDER_CODES) + ')',
     re.IGNORECASE
 )
 
 # ─── AMOUNT PATTERNS (Indian currency) ───────────────────────────────────
+# Only ever used as a flag. The suffix form starts at the beginning of a
+# digit run and takes it possessively: trying every position inside a long
+# bare number, each backing off digit by digit, is quadratic in its length.
 AMOUNT_PATTERN = re.compile(
     r'(?:Rs\.?|INR|₹)\s*[\d,]+(?:\.\d{1,2})?'
-    r'|[\d,]+(?:\.\d{1,2})?\s*(?:Rs\.?|INR|₹)',
+    r'|(?:^|[^\d,])[\d,]++(?:\.\d{1,2})?\s*(?:Rs\.?|INR|₹)',
     re.IGNORECASE
 )
 
@@ -174,7 +183,71 @@ NON_TRANSACTION_FINANCIAL = re.compile(
 )
 
 
-def label_sms(body: str, sender: str = "") -> Tuple[str, str, float]:
+# ─── SINGLE-PASS SCANNER (Hyperscan, optional) ───────────────────────────
+# All body patterns compiled into one database, so an SMS is scanned once
+# instead of once per pattern (see pattern_scanner.py for when it applies).
+SCANNED_PATTERNS = (
+    SPAM_INDICATORS, OTP_PATTERN, AMOUNT_PATTERN, CREDIT_INDICATORS,
+    DEBIT_INDICATORS, NON_TRANSACTION_FINANCIAL, ACCOUNT_PATTERN, UPI_PATTERN,
+    NEFT_PATTERN, IMPS_PATTERN, RTGS_PATTERN, CARD_PATTERN, WALLET_PATTERN,
+    BALANCE_PATTERN, PROMO_INDICATORS,
+)
+_scanner = PatternScanner(SCANNED_PATTERNS, name='Labeler')
+
+
+def scan_body(body: str) -> Optional[int]:
+    """
+    Bitmask of the SCANNED_PATTERNS that match somewhere in body (test
+    with scan_bit()), found in one pass. None when the single-pass scanner
+    can't be used for this body.
+    """
+    return _scanner.scan_mask(body)
+
+
+def scan_bodies(bodies: List[str]) -> List[Optional[int]]:
+    """scan_body() for a whole batch (columnar RE2 when Hyperscan is missing)."""
+    return _scanner.scan_masks(bodies)
+
+
+def scan_bit(pattern: re.Pattern) -> int:
+    """The scan_body() bit for one of the SCANNED_PATTERNS."""
+    return _scanner.bit(pattern)
+
+
+# ─── SENDER FORMAT ───────────────────────────────────────────────────────
+# An inbox has a few hundred distinct senders across all its messages, so
+# the sender checks are cached per sender string
+SENDER_CACHE_SIZE = 4096
+
+_bank_sender_automaton = build_automaton(BANK_SENDER_CODES)
+
+
+@lru_cache(maxsize=SENDER_CACHE_SIZE)
+def matches_bank_sender(sender_upper: str) -> bool:
+    """
+    Upper-cased sender contains one of the BANK_SENDER_CODES. One
+    Aho-Corasick pass when available; non-ASCII senders go through the
+    regex, whose case folding goes beyond str.upper().
+    """
+    if _bank_sender_automaton is not None and sender_upper.isascii():
+        return next(_bank_sender_automaton.iter(sender_upper), None) is not None
+    return bool(BANK_SENDER_PATTERNS.search(sender_upper))
+
+
+@lru_cache(maxsize=SENDER_CACHE_SIZE)
+def is_phone_sender(sender: str) -> bool:
+    """
+    Sender is a phone number: an optional '+' and at least 10 digits
+    (plain string checks, no regex call per SMS).
+    """
+    if sender.endswith('\n'):  # Ignored, as a regex '$' would
+        sender = sender[:-1]
+    digits = sender[1:] if sender.startswith('+') else sender
+    return len(digits) >= 10 and digits.isdecimal()  # isdecimal() is exactly re's \d
+
+
+def label_sms(body: str, sender: str = "", features: Dict = None,
+              scanned: Optional[int] = None) -> Tuple[str, str, float]:
     """
     Classify a single SMS and return (label, sub_label, confidence).
     
@@ -187,36 +260,62 @@ def label_sms(body: str, sender: str = "") -> Tuple[str, str, float]:
                      'promotional', 'personal', 'spam'
             - sub_label: more specific type (e.g., 'credit', 'debit', 'bill_payment')
             - confidence: 0.0 - 1.0
+    
+    features: optional extract_features() output for the same SMS. Its
+    body pattern and sender flags are reused instead of checking again.
+    scanned: scan_body(body), if the caller already has it.
+    Each pattern is decided at most once per message; on the re path the
+    Match objects are kept, so the credit/debit tie-break reuses them.
     """
     body_lower = body.lower().strip()
     sender_upper = sender.upper().strip()
+    features = features or {}
+    mask = scanned if scanned is not None else scan_body(body)
+    found = {}  # scan bit -> Match or None, for patterns searched with re
+    
+    def first(pattern):
+        bit = scan_bit(pattern)
+        if bit not in found:
+            found[bit] = pattern.search(body)
+        return found[bit]
+    
+    def has(pattern, key=None):
+        flag = features.get(key)
+        if flag is not None:
+            return flag
+        if mask is not None:
+            return bool(mask & scan_bit(pattern))
+        return first(pattern) is not None
     
     # ── 1. SPAM DETECTION (highest priority) ──
-    if SPAM_INDICATORS.search(body):
+    if has(SPAM_INDICATORS):
         return ('spam', 'phishing', 0.90)
     
     # ── 2. OTP DETECTION ──
-    if OTP_PATTERN.search(body):
+    if has(OTP_PATTERN, 'has_otp'):
         # OTPs with amounts are sometimes transaction OTPs
-        if AMOUNT_PATTERN.search(body) and (CREDIT_INDICATORS.search(body) or DEBIT_INDICATORS.search(body)):
+        if has(AMOUNT_PATTERN, 'has_amount') and (has(CREDIT_INDICATORS, 'has_credit_word')
+                                                   or has(DEBIT_INDICATORS, 'has_debit_word')):
             pass  # Fall through to transaction detection
         else:
             return ('otp', 'verification', 0.95)
     
     # ── 3. EARLY NON-TRANSACTION CHECK (highest priority for financials) ──
     # This MUST run before transaction scoring to block bill/alert SMS
-    is_non_transaction = bool(NON_TRANSACTION_FINANCIAL.search(body))
+    is_non_transaction = has(NON_TRANSACTION_FINANCIAL)
     
     # ── 4. TRANSACTION DETECTION ──
-    has_amount = bool(AMOUNT_PATTERN.search(body))
-    has_account = bool(ACCOUNT_PATTERN.search(body))
-    has_credit = bool(CREDIT_INDICATORS.search(body))
-    has_debit = bool(DEBIT_INDICATORS.search(body))
-    is_bank_sender = bool(BANK_SENDER_PATTERNS.search(sender_upper))
-    has_upi = bool(UPI_PATTERN.search(body))
-    has_neft = bool(NEFT_PATTERN.search(body))
-    has_imps = bool(IMPS_PATTERN.search(body))
-    has_balance = bool(BALANCE_PATTERN.search(body))
+    has_amount = has(AMOUNT_PATTERN, 'has_amount')
+    has_account = has(ACCOUNT_PATTERN, 'has_account')
+    has_credit = has(CREDIT_INDICATORS, 'has_credit_word')
+    has_debit = has(DEBIT_INDICATORS, 'has_debit_word')
+    is_bank_sender = features.get('is_bank_sender')
+    if is_bank_sender is None:
+        is_bank_sender = matches_bank_sender(sender_upper)
+    has_upi = has(UPI_PATTERN, 'has_upi')
+    has_neft = has(NEFT_PATTERN, 'has_neft')
+    has_imps = has(IMPS_PATTERN, 'has_imps')
+    has_balance = has(BALANCE_PATTERN, 'has_balance')
     
     # If this is a non-transactional financial SMS, SKIP transaction scoring
     # and go directly to financial_alert classification
@@ -239,10 +338,18 @@ def label_sms(body: str, sender: str = "") -> Tuple[str, str, float]:
             elif has_debit and not has_credit:
                 sub_label = 'debit'
             elif has_credit and has_debit:
-                # Both present — look at context
-                credit_pos = CREDIT_INDICATORS.search(body).start()
-                debit_pos = DEBIT_INDICATORS.search(body).start()
-                sub_label = 'debit' if debit_pos < credit_pos else 'credit'
+                # Both present — look at context. Should a scan backend
+                # flag a word re then can't find, go by the one re found.
+                credit = first(CREDIT_INDICATORS)
+                debit = first(DEBIT_INDICATORS)
+                if credit is not None and debit is not None:
+                    sub_label = 'debit' if debit.start() < credit.start() else 'credit'
+                elif credit is not None:
+                    sub_label = 'credit'
+                elif debit is not None:
+                    sub_label = 'debit'
+                else:
+                    sub_label = 'unknown_direction'
             else:
                 # Has amount + account but no clear direction
                 sub_label = 'unknown_direction'
@@ -273,12 +380,15 @@ def label_sms(body: str, sender: str = "") -> Tuple[str, str, float]:
         return ('financial_alert', sub_label, min(financial_alert_score + 0.10, 1.0))
     
     # ── 5. PROMOTIONAL ──
-    if PROMO_INDICATORS.search(body):
+    if has(PROMO_INDICATORS):
         return ('promotional', 'marketing', 0.80)
     
     # ── 6. PERSONAL SMS (fallback) ──
     # If sender is a phone number (not a shortcode), likely personal
-    if re.match(r'^\+?\d{10,}$', sender):
+    from_phone = features.get('is_phone_sender')
+    if from_phone is None:
+        from_phone = is_phone_sender(sender)
+    if from_phone:
         return ('personal', 'p2p_message', 0.70)
     
     # Default: promotional/informational
@@ -288,14 +398,16 @@ def label_sms(body: str, sender: str = "") -> Tuple[str, str, float]:
 def label_sms_batch(sms_list: list) -> list:
     """
     Label a batch of SMS messages. Each SMS should have 'body' and 'address' keys.
+    The bodies are scanned as one batch (see scan_bodies), then each goes
+    through the label_sms cascade.
     
     Returns list of dicts with original SMS data + label, sub_label, confidence.
     """
+    bodies = [sms.get('body', '') for sms in sms_list]
     results = []
-    for sms in sms_list:
-        body = sms.get('body', '')
+    for sms, body, scanned in zip(sms_list, bodies, scan_bodies(bodies)):
         sender = sms.get('address', '')
-        label, sub_label, confidence = label_sms(body, sender)
+        label, sub_label, confidence = label_sms(body, sender, scanned=scanned)
         
         labeled = dict(sms)
         labeled['label'] = label
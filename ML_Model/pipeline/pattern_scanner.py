@@ -0,0 +1,215 @@
+"""
+pattern_scanner.py — Single-Pass Multi-Pattern Matching
+========================================================
+Answers "which of these regexes match somewhere in this SMS?" with one
+scan of the body instead of one re.search per pattern.
+
+With Hyperscan installed, the patterns are compiled into one database.
+Only ASCII bodies take that path: there \\w, \\d, \\b and IGNORECASE agree
+with Python's re, and \\s is widened to the extra ASCII separators re
+counts as whitespace. Anything else (or no Hyperscan) returns None and
+the caller falls back to re, so results never depend on the backend.
+portable_source() does the same rewrite for other ASCII engines (RE2);
+without Hyperscan, scan_masks() uses it to scan a whole batch with
+PyArrow's RE2 kernels. Plain literal dictionaries go through build_automaton() (Aho-Corasick).
+"""
+
+import logging
+import re
+import threading
+from typing import Iterable, List, Optional, Set
+
+import numpy as np
+
+# Optional: Hyperscan matches every pattern in a single pass
+try:
+    import hyperscan
+    HAS_HYPERSCAN = True
+except ImportError:
+    HAS_HYPERSCAN = False
+
+# Optional: PyArrow runs each pattern over a whole column of bodies in RE2
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Optional: Aho-Corasick finds every word of a literal dictionary in one pass
+try:
+    import ahocorasick
+    HAS_AHOCORASICK = True
+except ImportError:
+    HAS_AHOCORASICK = False
+
+log = logging.getLogger(__name__)
+
+_RE_WHITESPACE = r'\s\x0b\x1c-\x1f'  # re's \s in ASCII; Hyperscan's \s lacks some
+
+# Below this many SMS, building an Arrow column costs more than it saves
+COLUMNAR_MIN_BATCH = 64
+
+
+def portable_source(pattern: re.Pattern, name_groups: bool = False) -> str:
+    """
+    A re pattern's source rewritten to match the same ASCII text in
+    Hyperscan or RE2 (flags are passed separately). Neither supports
+    possessive quantifiers, so they become plain greedy ones; patterns
+    only use them where backing off could never produce a match anyway.
+    With name_groups, capturing groups become (?P<g1>...), (?P<g2>...)
+    for APIs that only report named groups.
+    """
+    src = pattern.pattern.replace('(?i)', '').replace('\\u20b9', '₹')
+    out = []
+    in_class = False
+    groups = 0
+    i = 0
+    while i < len(src):
+        if src[i] == '\\':
+            escape = src[i:i + 2]
+            if escape == '\\s':
+                escape = _RE_WHITESPACE if in_class else f'[{_RE_WHITESPACE}]'
+            out.append(escape)
+            i += 2
+            continue
+        if src[i] == '[':
+            in_class = True
+        elif src[i] == ']':
+            in_class = False
+        elif src[i] == '(' and not in_class and name_groups and src[i + 1:i + 2] != '?':
+            groups += 1
+            out.append(f'(?P<g{groups}>')
+            i += 1
+            continue
+        elif src[i] == '+' and not in_class and out and out[-1] in ('+', '*', '?', '}'):
+            i += 1  # Possessive marker (a++, a*+, a?+, a{m,n}+)
+            continue
+        out.append(src[i])
+        i += 1
+    return ''.join(out)
+
+
+def re2_source(pattern: re.Pattern, name_groups: bool = False) -> str:
+    """portable_source() with IGNORECASE inlined, for APIs taking a bare RE2 string."""
+    src = portable_source(pattern, name_groups)
+    return f'(?i){src}' if pattern.flags & re.IGNORECASE else src
+
+
+def _to_hyperscan(pattern: re.Pattern) -> bytes:
+    return portable_source(pattern).encode('utf-8')
+
+
+def build_automaton(words: Iterable[str]):
+    """
+    An Aho-Corasick automaton over a fixed tuple of literals; iter() yields
+    (end_index, word_index) for every occurrence. None without pyahocorasick,
+    in which case the caller keeps its substring / regex checks.
+    """
+    if not HAS_AHOCORASICK:
+        return None
+    automaton = ahocorasick.Automaton()
+    for i, word in enumerate(words):
+        automaton.add_word(word, i)
+    automaton.make_automaton()
+    return automaton
+
+
+class PatternScanner:
+    """
+    One compiled database for a fixed tuple of re patterns. scan() returns
+    the set of patterns that match, or None when the body has to go
+    through re instead (no Hyperscan, compile failure, non-ASCII body).
+    """
+
+    def __init__(self, patterns: Iterable[re.Pattern], name: str = 'Scanner'):
+        self.patterns = tuple(patterns)
+        # Keyed by identity: hashing a re.Pattern re-hashes its compiled code
+        self._bits = {id(p): 1 << i for i, p in enumerate(self.patterns)}
+        self._db = self._compile(name)
+        self._scratch = threading.local()  # Hyperscan scratch space is per thread
+
+    def _compile(self, name: str):
+        if not HAS_HYPERSCAN:
+            return None
+        flags = [
+            hyperscan.HS_FLAG_SINGLEMATCH
+            | (hyperscan.HS_FLAG_CASELESS if p.flags & re.IGNORECASE else 0)
+            for p in self.patterns
+        ]
+        try:
+            db = hyperscan.Database()
+            db.compile(
+                expressions=[_to_hyperscan(p) for p in self.patterns],
+                ids=list(range(len(self.patterns))),
+                elements=len(self.patterns),
+                flags=flags,
+            )
+            return db
+        except hyperscan.error as e:
+            log.warning("[%s] Hyperscan compile failed, using re: %s", name, e)
+            return None
+
+    @property
+    def available(self) -> bool:
+        return self._db is not None
+
+    def _scratch_space(self):
+        scratch = getattr(self._scratch, 'scratch', None)
+        if scratch is None:
+            scratch = self._scratch.scratch = hyperscan.Scratch(self._db)
+        return scratch
+
+    def scan(self, body: str) -> Optional[Set[re.Pattern]]:
+        """The patterns that match somewhere in body, found in one pass."""
+        if self._db is None or not body.isascii():
+            return None
+        patterns = self.patterns
+        matched = set()
+
+        def on_match(pattern_id, start, end, flags, context):
+            matched.add(patterns[pattern_id])
+
+        self._db.scan(body.encode('ascii'), match_event_handler=on_match,
+                      scratch=self._scratch_space())
+        return matched
+
+    def bit(self, pattern: re.Pattern) -> int:
+        """pattern's bit in scan_mask() results."""
+        return self._bits[id(pattern)]
+
+    def scan_mask(self, body: str) -> Optional[int]:
+        """
+        Like scan(), but as a bitmask over self.patterns (see bit()), so
+        callers test flags without hashing pattern objects.
+        """
+        if self._db is None or not body.isascii():
+            return None
+        mask = 0
+
+        def on_match(pattern_id, start, end, flags, context):
+            nonlocal mask
+            mask |= 1 << pattern_id
+
+        self._db.scan(body.encode('ascii'), match_event_handler=on_match,
+                      scratch=self._scratch_space())
+        return mask
+
+    def scan_masks(self, bodies: List[str]) -> List[Optional[int]]:
+        """
+        scan_mask() for each body of a batch. Without Hyperscan, a large
+        enough batch runs each pattern once over an Arrow column in RE2
+        instead, with the same ASCII-only rule and the same masks.
+        """
+        if self._db is not None or not HAS_PYARROW or len(bodies) < COLUMNAR_MIN_BATCH:
+            return [self.scan_mask(body) for body in bodies]
+        eligible = [body.isascii() for body in bodies]
+        column = pa.array([body if ok else '' for body, ok in zip(bodies, eligible)], pa.string())
+        masks = np.zeros(len(bodies), dtype=object)  # Python ints: any number of bits
+        try:
+            for i, pattern in enumerate(self.patterns):
+                hits = pc.match_substring_regex(column, re2_source(pattern))
+                masks[hits.to_numpy(zero_copy_only=False)] += 1 << i
+        except pa.ArrowInvalid:  # A pattern RE2 can't compile
+            return [self.scan_mask(body) for body in bodies]
+        return [mask if ok else None for mask, ok in zip(masks.tolist(), eligible)]
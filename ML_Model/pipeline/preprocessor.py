@@ -6,117 +6,160 @@ Works with ANY Indian SMS - no dependency on specific training data.
 """
 
 import re
-import json
 import os
 import pandas as pd
-from typing import List, Dict
-from pipeline.labeler import label_sms_batch, AMOUNT_PATTERN, ACCOUNT_PATTERN, \
+from typing import List, Dict, Optional, Tuple
+from pipeline.storage import iter_records
+from pipeline.pattern_scanner import build_automaton
+from pipeline.labeler import label_sms, AMOUNT_PATTERN, ACCOUNT_PATTERN, \
     UPI_PATTERN, NEFT_PATTERN, IMPS_PATTERN, RTGS_PATTERN, CARD_PATTERN, \
-    WALLET_PATTERN, BANK_SENDER_PATTERNS, CREDIT_INDICATORS, DEBIT_INDICATORS, \
-    OTP_PATTERN, BALANCE_PATTERN
+    WALLET_PATTERN, CREDIT_INDICATORS, DEBIT_INDICATORS, \
+    OTP_PATTERN, BALANCE_PATTERN, scan_body, scan_bodies, scan_bit, is_phone_sender, \
+    matches_bank_sender
+
+# Compiled at import, like the labeler's patterns, so no call (and no
+# forked worker) has to go through re's compile cache
+URL_PATTERN = re.compile(r'https?://\S+')
+PHONE_NUMBER_PATTERN = re.compile(r'\b\d{10}\b')
+SHORTCODE_SENDER_PATTERN = re.compile(r'^[A-Z]{2}-')
+
+FINANCIAL_KEYWORDS = (
+    'rs', 'inr', 'credited', 'debited', 'a/c', 'account', 'balance',
+    'transaction', 'transfer', 'payment', 'upi', 'neft', 'imps',
+    'card', 'emi', 'loan', 'bank',
+)
+_keyword_automaton = build_automaton(FINANCIAL_KEYWORDS)
+
+
+def count_financial_keywords(body_lower: str) -> int:
+    """How many distinct FINANCIAL_KEYWORDS appear in body_lower."""
+    if _keyword_automaton is not None:
+        return len({i for _, i in _keyword_automaton.iter(body_lower)})
+    return sum(1 for kw in FINANCIAL_KEYWORDS if kw in body_lower)
 
 
 def clean_text(text: str) -> str:
     """Clean SMS text for processing."""
     if not text:
         return ""
-    # Remove URLs
-    text = re.sub(r'https?://\S+', '', text)
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    # Remove URLs (most SMS have none, so skip the regex pass)
+    if 'http' in text:
+        text = URL_PATTERN.sub('', text)
+    # Remove extra whitespace: str.split() splits on exactly re's \s
+    return ' '.join(text.split())
 
 
-def extract_features(body: str, sender: str = "") -> Dict:
+def extract_features(body: str, sender: str = "", body_clean: str = None,
+                     scanned: Optional[int] = None) -> Dict:
     """
     Extract hand-crafted features from SMS text.
     These are universal features that work for ANY Indian bank SMS.
+    Pass body_clean if clean_text(body) was already computed, and scanned
+    if scan_body(body) was.
     """
-    body_clean = clean_text(body)
+    if body_clean is None:
+        body_clean = clean_text(body)
     body_lower = body_clean.lower()
     sender_upper = sender.upper()
+    # One pass for all body patterns, when available
+    mask = scanned if scanned is not None else scan_body(body)
+    
+    def has(pattern):
+        return bool(mask & scan_bit(pattern)) if mask is not None else bool(pattern.search(body))
     
     return {
         # ── Text features ──
         'body_length': len(body_clean),
         'word_count': len(body_clean.split()),
-        'has_url': bool(re.search(r'https?://', body)),
-        'has_phone_number': bool(re.search(r'\b\d{10}\b', body)),
+        'has_url': 'http://' in body or 'https://' in body,
+        'has_phone_number': bool(PHONE_NUMBER_PATTERN.search(body)),
         
         # ── Financial features ──
-        'has_amount': bool(AMOUNT_PATTERN.search(body)),
-        'has_account': bool(ACCOUNT_PATTERN.search(body)),
-        'has_credit_word': bool(CREDIT_INDICATORS.search(body)),
-        'has_debit_word': bool(DEBIT_INDICATORS.search(body)),
-        'has_balance': bool(BALANCE_PATTERN.search(body)),
+        'has_amount': has(AMOUNT_PATTERN),
+        'has_account': has(ACCOUNT_PATTERN),
+        'has_credit_word': has(CREDIT_INDICATORS),
+        'has_debit_word': has(DEBIT_INDICATORS),
+        'has_balance': has(BALANCE_PATTERN),
         
         # ── Payment method features ──
-        'has_upi': bool(UPI_PATTERN.search(body)),
-        'has_neft': bool(NEFT_PATTERN.search(body)),
-        'has_imps': bool(IMPS_PATTERN.search(body)),
-        'has_rtgs': bool(RTGS_PATTERN.search(body)),
-        'has_card': bool(CARD_PATTERN.search(body)),
-        'has_wallet': bool(WALLET_PATTERN.search(body)),
+        'has_upi': has(UPI_PATTERN),
+        'has_neft': has(NEFT_PATTERN),
+        'has_imps': has(IMPS_PATTERN),
+        'has_rtgs': has(RTGS_PATTERN),
+        'has_card': has(CARD_PATTERN),
+        'has_wallet': has(WALLET_PATTERN),
         
         # ── Sender features ──
-        'is_bank_sender': bool(BANK_SENDER_PATTERNS.search(sender_upper)),
-        'is_shortcode_sender': bool(re.match(r'^[A-Z]{2}-', sender_upper)),
-        'is_phone_sender': bool(re.match(r'^\+?\d{10,}$', sender)),
+        'is_bank_sender': matches_bank_sender(sender_upper),
+        'is_shortcode_sender': bool(SHORTCODE_SENDER_PATTERN.match(sender_upper)),
+        'is_phone_sender': is_phone_sender(sender),
         
         # ── OTP / Security features ──
-        'has_otp': bool(OTP_PATTERN.search(body)),
+        'has_otp': has(OTP_PATTERN),
         
         # ── Keyword counts ──
-        'financial_keyword_count': sum(1 for kw in 
-            ['rs', 'inr', 'credited', 'debited', 'a/c', 'account', 'balance',
-             'transaction', 'transfer', 'payment', 'upi', 'neft', 'imps',
-             'card', 'emi', 'loan', 'bank']
-            if kw in body_lower),
+        'financial_keyword_count': count_financial_keywords(body_lower),
     }
 
 
-def load_and_preprocess(json_path: str) -> pd.DataFrame:
+def label_and_featurize(body: str, sender: str = "", body_clean: str = None,
+                        scanned: Optional[int] = None) -> Tuple[Tuple[str, str, float], Dict]:
+    """
+    label_sms() and extract_features() for one SMS, sharing a single body
+    scan and every flag they both use. Returns ((label, sub_label,
+    confidence), features).
     """
-    Load SMS data from JSON and create a fully featured DataFrame.
+    if scanned is None:
+        scanned = scan_body(body)
+    features = extract_features(body, sender, body_clean, scanned)
+    return label_sms(body, sender, features, scanned), features
+
+
+def load_and_preprocess(json_path: str, skip: int = 0) -> pd.DataFrame:
+    """
+    Load SMS data from JSONL (or a legacy JSON array) and create a fully
+    featured DataFrame.
+    
+    skip: number of leading records to leave out (already preprocessed
+    and cached by the caller).
     
     Returns DataFrame with original data + labels + features.
     """
-    with open(json_path, 'r', encoding='utf-8') as f:
-        raw_data = json.load(f)
+    raw_data = list(iter_records(json_path, skip))
+    if not raw_data:
+        return pd.DataFrame()
     
-    # Auto-label
-    labeled_data = label_sms_batch(raw_data)
+    # Built column by column: one list per field, no per-row record dict
+    bodies = [sms.get('body', '') for sms in raw_data]
+    senders = [sms.get('address', '') for sms in raw_data]
+    cleaned = [clean_text(body) for body in bodies]
     
-    # Build DataFrame
-    records = []
-    for sms in labeled_data:
-        body = sms.get('body', '')
-        sender = sms.get('address', '')
-        
-        record = {
-            'sms_id': sms.get('_id', ''),
-            'thread_id': sms.get('thread_id', ''),
-            'sender': sender,
-            'body': body,
-            'body_clean': clean_text(body),
-            'timestamp': sms.get('date', ''),
-            'date_sent': sms.get('date_sent', ''),
-            'sms_type': sms.get('type', ''),
-            'read': sms.get('read', ''),
-            'service_center': sms.get('service_center', ''),
-            'label': sms.get('label', ''),
-            'sub_label': sms.get('sub_label', ''),
-            'label_confidence': sms.get('label_confidence', 0),
-        }
-        
-        # Add computed features
-        features = extract_features(body, sender)
-        record.update(features)
-        
-        records.append(record)
+    # Auto-label and featurize, the bodies scanned as one batch
+    results = [label_and_featurize(body, sender, body_clean, scanned)
+               for body, sender, body_clean, scanned
+               in zip(bodies, senders, cleaned, scan_bodies(bodies))]
     
-    df = pd.DataFrame(records)
-    return df
+    columns = {
+        'sms_id': [sms.get('_id', '') for sms in raw_data],
+        'thread_id': [sms.get('thread_id', '') for sms in raw_data],
+        'sender': senders,
+        'body': bodies,
+        'body_clean': cleaned,
+        'timestamp': [sms.get('date', '') for sms in raw_data],
+        'date_sent': [sms.get('date_sent', '') for sms in raw_data],
+        'sms_type': [sms.get('type', '') for sms in raw_data],
+        'read': [sms.get('read', '') for sms in raw_data],
+        'service_center': [sms.get('service_center', '') for sms in raw_data],
+        'label': [label for (label, _, _), _ in results],
+        'sub_label': [sub_label for (_, sub_label, _), _ in results],
+        'label_confidence': [round(confidence, 3) for (_, _, confidence), _ in results],
+    }
+    
+    # Add computed features
+    for key in results[0][1]:
+        columns[key] = [features[key] for _, features in results]
+    
+    return pd.DataFrame(columns)
 
 
 def export_csv(df: pd.DataFrame, output_path: str):
@@ -137,24 +180,33 @@ def export_csv(df: pd.DataFrame, output_path: str):
         print(f"  {sub:30s} {count:5d}  ({pct:.1f}%)")
 
 
-def preprocess_single_sms(sms: dict) -> dict:
+def preprocess_batch(sms_list: List[dict]) -> List[dict]:
     """
-    Preprocess a single SMS message — used in real-time API processing.
-    Returns the SMS enriched with label and features.
-    """
-    from pipeline.labeler import label_sms
-    
-    body = sms.get('body', '')
-    sender = sms.get('address', '')
+    Preprocess a batch of SMS — used in real-time API processing.
+    Returns each SMS enriched with label and features, in input order.
     
-    label, sub_label, confidence = label_sms(body, sender)
-    features = extract_features(body, sender)
-    
-    result = dict(sms)
-    result['label'] = label
-    result['sub_label'] = sub_label
-    result['label_confidence'] = round(confidence, 3)
-    result['body_clean'] = clean_text(body)
-    result.update(features)
+    Each body is cleaned and scanned once, and the labeler reuses the
+    feature flags instead of re-running the same regex searches.
+    """
+    results = []
+    for sms in sms_list:
+        body = sms.get('body', '')
+        sender = sms.get('address', '')
+        body_clean = clean_text(body)
+        
+        (label, sub_label, confidence), features = label_and_featurize(body, sender, body_clean)
+        
+        result = dict(sms)
+        result['label'] = label
+        result['sub_label'] = sub_label
+        result['label_confidence'] = round(confidence, 3)
+        result['body_clean'] = body_clean
+        result.update(features)
+        results.append(result)
     
-    return result
+    return results
+
+
+def preprocess_single_sms(sms: dict) -> dict:
+    """Preprocess a single SMS message. Returns it enriched with label and features."""
+    return preprocess_batch([sms])[0]
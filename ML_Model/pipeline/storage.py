@@ -0,0 +1,153 @@
+"""
+storage.py — Append-only JSONL Record Storage
+==============================================
+File-based fallback storage shared by the API, the auto-trainer and the
+offline training script. One JSON object per line, so new records are
+appended instead of rewriting the whole file, and counting records is a
+line count instead of a full parse.
+
+Readers also accept the legacy format (a single JSON array), so older
+exports like the bundled sms_data.json keep working.
+"""
+
+import mmap
+import os
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List
+
+import orjson
+
+_COUNT_CHUNK = 1 << 20  # 1 MiB reads for line counting
+_DUMPS_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _encode(record: dict) -> bytes:
+    return orjson.dumps(record, option=_DUMPS_OPTS) + b'\n'
+
+
+def _is_legacy_array(path: str) -> bool:
+    """True if the file holds a single JSON array rather than JSONL."""
+    with open(path, 'rb') as f:
+        head = f.read(64).lstrip()
+    return head.startswith(b'[')
+
+
+def load_json(path: str):
+    """
+    Parse a whole JSON document straight from a read-only memory map, so a
+    large file is not first copied into a bytes object of the same size.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return orjson.loads(b'')  # Raises JSONDecodeError, like the plain read did
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+
+
+def iter_records(path: str, skip: int = 0) -> Iterator[dict]:
+    """
+    Yield records one at a time (JSONL is never fully materialized). The
+    first skip records are passed over without being parsed.
+    """
+    if not os.path.exists(path):
+        return
+    if _is_legacy_array(path):
+        yield from islice(load_json(path), skip, None)
+        return
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            yield orjson.loads(line)
+
+
+def read_records(path: str) -> List[dict]:
+    """Load all records from a JSONL (or legacy JSON array) file."""
+    return list(iter_records(path))
+
+
+def append_records(path: str, records: Iterable[dict]):
+    """Append records to a JSONL file — O(new records), not O(history)."""
+    data = b''.join(_encode(r) for r in records)
+    if not data:
+        return
+    with open(path, 'ab') as f:
+        f.write(data)
+
+
+def write_atomic(path: str, data: bytes):
+    """Publish a file in one step: write a sibling temp file, then rename.
+
+    Readers see either the old or the new contents, never a half-written file.
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def write_records(path: str, records: Iterable[dict]):
+    """Rewrite a JSONL file with exactly these records."""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.writelines(_encode(r) for r in records)
+    os.replace(tmp, path)
+
+
+def filter_records(path: str, keep: Callable[[dict], bool]) -> int:
+    """
+    Stream records through keep() into a temp file and atomically replace
+    the original, but only if something was dropped. Returns the number of
+    records removed. Memory use is O(1) in the file size.
+    """
+    if not os.path.exists(path):
+        return 0
+    tmp = path + '.tmp'
+    removed = 0
+    with open(tmp, 'wb') as out:
+        for record in iter_records(path):
+            if keep(record):
+                out.write(_encode(record))
+            else:
+                removed += 1
+    if removed:
+        os.replace(tmp, path)
+    else:
+        os.remove(tmp)
+    return removed
+
+
+def count_records(path: str) -> int:
+    """
+    Count records without parsing or allocating them (one record per line).
+    Blank lines are skipped, as iter_records() skips them, so the count
+    always matches what a read returns.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0
+    if _is_legacy_array(path):
+        return len(read_records(path))
+    count = 0
+    tail = b''  # Partial line carried over from the previous chunk
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_COUNT_CHUNK), b''):
+            lines = (tail + chunk).split(b'\n')
+            tail = lines.pop()
+            count += sum(1 for line in lines if line.strip())
+    if tail.strip():
+        count += 1  # Last record written without a trailing newline
+    return count
+
+
+def migrate_legacy_json(legacy_path: str, path: str) -> bool:
+    """Convert a legacy JSON-array file to JSONL once. Returns True if migrated."""
+    if os.path.exists(path) or not os.path.exists(legacy_path):
+        return False
+    write_records(path, read_records(legacy_path))
+    return True
+
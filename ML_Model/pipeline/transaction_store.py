@@ -0,0 +1,177 @@
+"""
+transaction_store.py — SQLite Transaction Storage
+==================================================
+File-based fallback store for extracted transactions, replacing the
+transactions JSONL file. Each transaction is kept whole as a JSON blob,
+next to a few indexed columns for lookups, and under a UNIQUE content
+hash so duplicates are rejected by the database on insert.
+
+Inserts are O(batch) in one SQLite transaction; nothing rewrites the
+whole history. WAL mode lets readers in other processes (or a future
+second connection) proceed while a write is in flight.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import orjson
+
+_DUMPS_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id               INTEGER PRIMARY KEY,
+    hash             BLOB NOT NULL UNIQUE,
+    sms_id           TEXT,
+    timestamp        INTEGER,
+    amount           REAL,
+    transaction_type TEXT,
+    category         TEXT,
+    payment_method   TEXT,
+    bank_name        TEXT,
+    counterparty     TEXT,
+    record           BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_sms_id ON transactions(sms_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions(timestamp);
+"""
+
+_INSERT = """
+INSERT OR IGNORE INTO transactions
+    (hash, sms_id, timestamp, amount, transaction_type, category,
+     payment_method, bank_name, counterparty, record)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def _float_or_none(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _text_or_none(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _row(digest: bytes, txn: dict) -> tuple:
+    return (
+        digest,
+        _text_or_none(txn.get('sms_id')),
+        _int_or_none(txn.get('timestamp')),
+        _float_or_none(txn.get('amount')),
+        txn.get('transaction_type'),
+        _text_or_none(txn.get('category')),
+        _text_or_none(txn.get('payment_method')),
+        _text_or_none(txn.get('bank_name')),
+        _text_or_none(txn.get('counterparty')),
+        orjson.dumps(txn, option=_DUMPS_OPTS),
+    )
+
+
+class TransactionStore:
+    """
+    Transactions in one SQLite file. A single connection is shared by the
+    event loop and worker threads, serialized by a lock; every statement
+    here is short, so contention is negligible next to the JSON work.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.created = not os.path.exists(path)  # True on first run (migrate old data)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; safe with WAL
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stamp(self) -> Tuple[int, int]:
+        """Changes whenever the table changes, from this connection or another process."""
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            return data_version, self._conn.total_changes
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def all(self) -> List[dict]:
+        """Every transaction in insertion order."""
+        with self._lock:
+            rows = self._conn.execute("SELECT record FROM transactions ORDER BY id").fetchall()
+        return [orjson.loads(r[0]) for r in rows]
+
+    def last(self, n: int) -> List[dict]:
+        """The n most recently stored transactions, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT record FROM transactions ORDER BY id DESC LIMIT ?", (n,)
+            ).fetchall()
+        return [orjson.loads(r[0]) for r in reversed(rows)]
+
+    def insert_new(self, items: Iterable[Tuple[bytes, dict]]) -> List[dict]:
+        """
+        Insert (hash, transaction) pairs in one transaction, skipping any
+        whose hash is already stored (or repeated earlier in the batch).
+        Returns the transactions that were actually inserted.
+        """
+        inserted = []
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                for digest, txn in items:
+                    cur.execute(_INSERT, _row(digest, txn))
+                    if cur.rowcount == 1:
+                        inserted.append(txn)
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+        return inserted
+
+    def replace_all(self, items: Iterable[Tuple[bytes, dict]]) -> int:
+        """Atomically replace every stored transaction. Returns the new count."""
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                cur.execute("DELETE FROM transactions")
+                cur.executemany(_INSERT, (_row(d, t) for d, t in items))
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+            return self._conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def update_category(self, sms_id, category: str) -> Optional[dict]:
+        """Set a user-edited category on the first transaction with this sms_id."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, record FROM transactions WHERE sms_id = ? ORDER BY id LIMIT 1",
+                (str(sms_id),),
+            ).fetchone()
+            if row is None:
+                return None
+            txn = orjson.loads(row[1])
+            txn['category'] = category
+            txn['category_edited'] = True
+            self._conn.execute(
+                "UPDATE transactions SET category = ?, record = ? WHERE id = ?",
+                (category, orjson.dumps(txn, option=_DUMPS_OPTS), row[0]),
+            )
+            return txn
@@ -6,8 +6,11 @@ transaction storage, and ML training log.
 """
 
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from postgrest import ReturnMethod
 
 # Load .env from ML_Model directory
 load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
@@ -23,16 +26,24 @@ SUPABASE_ANON_KEY = os.getenv(
     "SUPABASE_ANON_KEY",
 )
 
+# Parallel row writes per batch; they share the client's pooled connections
+WRITE_CONCURRENCY = int(os.getenv("SUPABASE_WRITE_CONCURRENCY", "8"))
+
 # ─── Client Singleton ───────────────────────────────────────────────────
 _client: Client = None
+_client_lock = threading.Lock()
+_write_pool = ThreadPoolExecutor(max_workers=WRITE_CONCURRENCY, thread_name_prefix="supabase-write")
 
 
 def get_client() -> Client:
     """Get or create Supabase client (service role for backend ops)."""
     global _client
     if _client is None:
-        _client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-        print(f"[Supabase] Connected to {SUPABASE_URL}")
+        # API handlers call in from worker threads; build exactly one client
+        with _client_lock:
+            if _client is None:
+                _client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+                print(f"[Supabase] Connected to {SUPABASE_URL}")
     return _client
 
 
@@ -157,10 +168,20 @@ def store_sms_batch(user_id: str, sms_list: list) -> int:
     Returns count of newly inserted SMS.
     """
     client = get_client()
-    new_count = 0
     
+    def _upsert(row: dict) -> bool:
+        try:
+            result = client.table("sms_messages").upsert(
+                row, on_conflict="user_id,sms_id"
+            ).execute()
+            return bool(result.data)
+        except Exception as e:
+            print(f"[Supabase] SMS insert error: {e}")
+            return False
+    
+    rows = []
     for sms in sms_list:
-        row = {
+        rows.append({
             "user_id": user_id,
             "sms_id": str(sms.get("_id", "")),
             "thread_id": str(sms.get("thread_id", "")),
@@ -176,18 +197,10 @@ def store_sms_batch(user_id: str, sms_list: list) -> int:
             "label_confidence": sms.get("label_confidence", 0),
             "is_spam": sms.get("is_spam", False),
             "is_genuine": sms.get("is_genuine", True),
-        }
-        
-        try:
-            result = client.table("sms_messages").upsert(
-                row, on_conflict="user_id,sms_id"
-            ).execute()
-            if result.data:
-                new_count += 1
-        except Exception as e:
-            print(f"[Supabase] SMS insert error: {e}")
+        })
     
-    return new_count
+    # Rows are independent upserts, so send them concurrently
+    return sum(_write_pool.map(_upsert, rows))
 
 
 def get_user_sms_count(user_id: str) -> int:
@@ -201,10 +214,7 @@ def get_user_sms_count(user_id: str) -> int:
 # TRANSACTION STORAGE
 # ═══════════════════════════════════════════════════════════════════════
 
-def store_transaction(user_id: str, txn: dict) -> dict:
-    """Store a single transaction with dedup."""
-    client = get_client()
-    
+def _transaction_row(user_id: str, txn: dict) -> dict:
     row = {
         "user_id": user_id,
         "sms_id": txn.get("sms_id", ""),
@@ -231,6 +241,13 @@ def store_transaction(user_id: str, txn: dict) -> dict:
     txn_date = txn.get("transaction_date")
     if txn_date:
         row["transaction_date"] = txn_date
+    return row
+
+
+def store_transaction(user_id: str, txn: dict) -> dict:
+    """Store a single transaction with dedup."""
+    client = get_client()
+    row = _transaction_row(user_id, txn)
     
     try:
         result = client.table("transactions").upsert(
@@ -243,13 +260,36 @@ def store_transaction(user_id: str, txn: dict) -> dict:
 
 
 def store_transactions_batch(user_id: str, transactions: list) -> int:
-    """Store a batch of transactions. Returns count stored."""
-    count = 0
+    """Store a batch of transactions concurrently. Returns count stored."""
+    results = _write_pool.map(lambda txn: store_transaction(user_id, txn), transactions)
+    return sum(1 for result in results if result)
+
+
+def store_transactions_bulk(user_id: str, transactions: list) -> int:
+    """
+    Store transactions with a single bulk upsert (one HTTP request, no rows
+    echoed back). Falls back to per-row writes if the bulk request fails,
+    so one bad row can't drop the rest. Returns count stored.
+    """
+    if not transactions:
+        return 0
+    # One statement can't upsert the same key twice; keep the last, as
+    # sequential upserts would
+    rows = {}
     for txn in transactions:
-        result = store_transaction(user_id, txn)
-        if result:
-            count += 1
-    return count
+        row = _transaction_row(user_id, txn)
+        rows[row["sms_id"]] = row
+    try:
+        get_client().table("transactions").upsert(
+            list(rows.values()),
+            on_conflict="user_id,sms_id",
+            returning=ReturnMethod.minimal,
+            default_to_null=False,  # Omitted columns get their defaults, as single inserts do
+        ).execute()
+        return len(rows)
+    except Exception as e:
+        print(f"[Supabase] Bulk transaction insert error, retrying per row: {e}")
+        return store_transactions_batch(user_id, transactions)
 
 
 def get_user_transactions(user_id: str, limit: int = 500) -> list:
@@ -0,0 +1,60 @@
+"""
+test_extractor.py — Transaction Extractor Regression Tests
+==========================================================
+Run from ML_Model/:  python -m unittest discover tests
+"""
+
+import unittest
+from unittest import mock
+
+from pipeline.extractor import extract_transaction, extract_transactions_batch, parse_all_amounts
+from pipeline import extractor
+from pipeline.pattern_scanner import COLUMNAR_MIN_BATCH
+
+# Amount and balance start deep into the body; a fixed prefix cut used to
+# split the amount to 1.0 and drop the balance
+LONG_PREFIX_SMS = {
+    'body': 'x' * 244 + ' Rs 1,23,456.78 debited from A/c XX1234. Avl Bal Rs 5,000.00',
+    'address': 'VM-HDFCBK',
+    'date': '1700000000000',
+}
+
+
+class TestLongBodies(unittest.TestCase):
+
+    def check(self, txn):
+        self.assertEqual(txn['amount'], 123456.78)
+        self.assertEqual(txn['balance_after'], 5000.0)
+        self.assertEqual(txn['account_number'], 'XX1234')
+
+    def test_single_sms(self):
+        self.check(extract_transaction(LONG_PREFIX_SMS))
+
+    def test_columnar_batch(self):
+        batch = [dict(LONG_PREFIX_SMS, _id=str(i)) for i in range(COLUMNAR_MIN_BATCH)]
+        for txn in extract_transactions_batch(batch):
+            self.check(txn)
+
+    @unittest.skipUnless(extractor.HAS_PYARROW, 'pyarrow not installed')
+    def test_columnar_batch_re2_rejects_pattern(self):
+        # Lookbehind is valid re but not RE2: the batch is parsed per SMS
+        batch = [dict(LONG_PREFIX_SMS, _id=str(i)) for i in range(COLUMNAR_MIN_BATCH)]
+        with mock.patch.object(extractor, 'BALANCE_REGEX',
+                               extractor.re.compile(r'(?<=Bal )Rs\s*([\d,]+(?:\.\d{1,2})?)')):
+            for txn in extractor.extract_transactions_batch(batch):
+                self.check(txn)
+
+
+class TestAmounts(unittest.TestCase):
+
+    def test_long_digit_run(self):
+        # A bare run is never split into a suffix amount (and stays linear)
+        self.assertEqual(parse_all_amounts('9' * 20000 + ' paid Rs 50'), [50.0])
+
+    def test_suffix_amounts(self):
+        self.assertEqual(parse_all_amounts('Rs 100 and 200 Rs, INR 5,000.50; 7Rs'),
+                         [100.0, 200.0, 5000.5, 7.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
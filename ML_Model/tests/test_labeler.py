@@ -0,0 +1,30 @@
+"""
+test_labeler.py — Rule-Based Labeler Regression Tests
+=====================================================
+Run from ML_Model/:  python -m unittest discover tests
+"""
+
+import unittest
+
+from pipeline.labeler import CREDIT_INDICATORS, SCANNED_PATTERNS, label_sms, scan_bit
+
+DEBIT_SMS = 'Rs 500 debited from A/c XX1234 via UPI. Avl Bal Rs 2,000.00'
+
+
+class TestCreditDebitTieBreak(unittest.TestCase):
+
+    def test_mask_flags_word_re_cannot_find(self):
+        # The mask also claims a credit word; re finds only the debit one,
+        # so that decides instead of raising
+        mask = sum(scan_bit(p) for p in SCANNED_PATTERNS if p.search(DEBIT_SMS))
+        mask |= scan_bit(CREDIT_INDICATORS)
+        label, sub_label, _ = label_sms(DEBIT_SMS, 'VM-HDFCBK', scanned=mask)
+        self.assertEqual((label, sub_label), ('financial_transaction', 'debit'))
+
+    def test_both_words_earliest_wins(self):
+        body = 'Rs 500 debited from A/c XX1234 and credited to A/c XX9876'
+        self.assertEqual(label_sms(body, 'VM-HDFCBK')[:2], ('financial_transaction', 'debit'))
+
+
+if __name__ == '__main__':
+    unittest.main()
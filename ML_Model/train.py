@@ -8,6 +8,7 @@ precision-recall curves, and label distribution.
 Usage:
     python train.py
     python train.py --data path/to/sms_data.json
+    python train.py --data sms_data.jsonl   # live store written by the API
 """
 
 import os
@@ -56,7 +57,7 @@ COLORS = ['#58a6ff', '#3fb950', '#f0883e', '#f778ba', '#bc8cff',
 
 def main():
     parser = argparse.ArgumentParser(description='Train FinSight SMS Analysis Pipeline')
-    parser.add_argument('--data', default='sms_data.json', help='Path to SMS JSON data')
+    parser.add_argument('--data', default='sms_data.json', help='Path to SMS JSON / JSONL data')
     args = parser.parse_args()
     
     base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -83,7 +84,7 @@ def main():
     plot_label_distribution(df, results_dir)
     
     # ── Step 3: Train Classifier ──
-    print("\n[3/9] Training ML classifier ensemble...")
+    print("\n[3/9] Training ML classifier (XGBoost)...")
     classifier = SmsClassifier()
     metrics = classifier.train(df, save=True)
     